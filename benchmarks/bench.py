@@ -0,0 +1,347 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def metric(value, unit, better):
+    return {"value": float(value), "unit": unit, "better": better}
+
+
+def best_of(fn, repeat):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_step(quick=False):
+    from maxwell_app.integrators import INTEGRATORS
+    from maxwell_app.simulation import MaxwellWheelSimulation
+
+    # 10 s of simulated time at dt = 1 ms: with the default friction torque
+    # the wheel comes to rest after about 14 s, so every step is a real one.
+    steps = 2_000 if quick else 10_000
+    results = {}
+    for name in INTEGRATORS:
+        for friction in (False, True):
+
+            def run():
+                sim = MaxwellWheelSimulation()
+                sim.set_integrator(name)
+                sim.friction_enabled = friction
+                sim.running = True
+                for _ in range(steps):
+                    sim.step(0.001)
+
+            elapsed = best_of(run, 2 if quick else 5)
+            key = f"step.{name}" + (".friction" if friction else "")
+            results[key] = metric(steps / elapsed, "steps/s", "higher")
+    return results
+
+
+def bench_graph(quick=False):
+    import pygame
+
+    from maxwell_app.graphs import SeriesGraph, draw_series_graph
+
+    sizes = (1_000, 100_000) if quick else (1_000, 100_000, 1_000_000)
+    rect = pygame.Rect(0, 0, 280, 130)
+    surface = pygame.Surface(rect.size)
+    colors = [(255, 0, 0), (0, 0, 255)]
+    results = {}
+    for n in sizes:
+        times = np.linspace(0.0, n * 0.01, n)
+        series = [np.sin(times), np.cos(3.0 * times)]
+        elapsed = best_of(lambda: draw_series_graph(surface, rect, times, series, colors), 3 if quick else 7)
+        results[f"graph.draw.{n}"] = metric(elapsed * 1000.0, "ms", "lower")
+
+        # The live graphs only draw the samples added since the last frame.
+        best = math.inf
+        for _ in range(3 if quick else 7):
+            graph = SeriesGraph(rect, colors)
+            graph.update(times[: n - 10], [s[: n - 10] for s in series], 0)
+            start = time.perf_counter()
+            graph.update(times, series, 0)
+            best = min(best, time.perf_counter() - start)
+        results[f"graph.append.{n}"] = metric(best * 1000.0, "ms", "lower")
+    return results
+
+
+def bench_save_plots(quick=False):
+    from maxwell_app.plots import save_plots
+
+    n = 2_000 if quick else 20_000
+    t = np.arange(1, n + 1) * 0.01
+    history = {"t": t, "h": np.sin(t), "v": np.cos(t), "ep": t, "ek_t": t, "ek_r": t}
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        save_plots(history, folder)
+        cold = time.perf_counter() - start
+        warm = best_of(lambda: save_plots(history, folder), 1 if quick else 3)
+    return {
+        "save_plots.cold": metric(cold * 1000.0, "ms", "lower"),
+        "save_plots.warm": metric(warm * 1000.0, "ms", "lower"),
+    }
+
+
+FULL_REDRAW_EVERY = 10
+
+
+def frame_script(frames, stamps):
+    import pygame
+
+    # Start, switch to "as fast as possible" so every frame has new samples
+    # to draw, reset halfway and start again. Every FULL_REDRAW_EVERY-th
+    # frame is exposed, which forces a full repaint.
+    clicks = {2: (160, 90), 3: (1315, 877), frames // 2: (160, 250), frames // 2 + 2: (160, 90)}
+
+    def script(frame):
+        stamps.append(time.perf_counter())
+        events = [pygame.event.Event(pygame.MOUSEMOTION, pos=(40 + frame % 240, 60 + frame % 600), rel=(1, 1), buttons=(0, 0, 0))]
+        if frame in clicks:
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=clicks[frame], button=1))
+        if frame % FULL_REDRAW_EVERY == 0:
+            events.append(pygame.event.Event(pygame.VIDEOEXPOSE))
+        return events
+
+    return script
+
+
+def bench_frame(quick=False):
+    from maxwell_app import app
+
+    frames = 120 if quick else 600
+    stamps = []
+    start = time.perf_counter()
+    app.run(fps=0, max_frames=frames, script=frame_script(frames, stamps))
+    total = time.perf_counter() - start
+
+    # stamps[i] is taken at the start of frame i, so diff[i] is the cost of
+    # frame i. Skip the first frames: they warm the caches.
+    times = np.diff(stamps) * 1000.0
+    frame = np.arange(len(times))
+    full = times[(frame >= 5) & (frame % FULL_REDRAW_EVERY == 0)]
+    partial = times[(frame >= 5) & (frame % FULL_REDRAW_EVERY != 0)]
+    return {
+        "frame.mean": metric(partial.mean(), "ms", "lower"),
+        "frame.p50": metric(np.percentile(partial, 50), "ms", "lower"),
+        "frame.p95": metric(np.percentile(partial, 95), "ms", "lower"),
+        "frame.max": metric(partial.max(), "ms", "lower"),
+        "frame.full_redraw": metric(np.median(full), "ms", "lower"),
+        "frame.run_total": metric(total * 1000.0, "ms", "lower"),
+    }
+
+
+def bench_compare(quick=False):
+    from maxwell_app import app
+    from maxwell_app.compare import Comparison
+    from maxwell_app.config import COMPARE_MAX_WHEELS
+    from maxwell_app.params import WheelParams
+
+    base = WheelParams(0.045, 0.0075, 5.25e-5, 0.24, 9.81, 0.0005)
+
+    def wheels(count):
+        return Comparison([base.replace(m=base.m * (1 + 0.05 * i)) for i in range(count)])
+
+    steps = 2_000 if quick else 10_000
+    results = {}
+    for count in (1, 8, COMPARE_MAX_WHEELS):
+
+        def run():
+            comparison = wheels(count)
+            comparison.running = True
+            for _ in range(steps):
+                comparison.step(0.001)
+
+        elapsed = best_of(run, 2 if quick else 5)
+        results[f"compare.step.{count}"] = metric(steps / elapsed, "steps/s", "higher")
+
+    # The largest comparison on screen: the frame scenario (as fast as
+    # possible, the worst case for the graphs), then real time at FPS.
+    frames = 120 if quick else 600
+    stamps = []
+    app.run(fps=0, max_frames=frames, script=frame_script(frames, stamps), comparison=wheels(COMPARE_MAX_WHEELS))
+    times = np.diff(stamps)[5:] * 1000.0
+    results["compare.frame.p50"] = metric(np.percentile(times, 50), "ms", "lower")
+    results["compare.frame.p95"] = metric(np.percentile(times, 95), "ms", "lower")
+
+    comparison = wheels(COMPARE_MAX_WHEELS)
+    comparison.running = True
+    stamps = []
+    app.run(max_frames=frames, script=lambda frame: stamps.append(time.perf_counter()) or (), comparison=comparison)
+    results["compare.fps"] = metric((len(stamps) - 6) / (stamps[-1] - stamps[5]), "fps", "higher")
+    return results
+
+
+def bench_server(quick=False):
+    import asyncio
+
+    from maxwell_app.server import SimulationServer
+
+    clients, requests = (20, 20) if quick else (100, 50)
+    batch = 100_000 if quick else 1_000_000
+    results = {}
+
+    async def request(reader, writer, head, body=b""):
+        writer.write(head.encode("latin-1") + b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        await writer.drain()
+        header = await reader.readuntil(b"\r\n\r\n")
+        length = next(int(line.split(b":")[1]) for line in header.split(b"\r\n") if line.lower().startswith(b"content-length:"))
+        return await reader.readexactly(length)
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for _ in range(requests):
+            await request(reader, writer, "GET /state HTTP/1.1\r\n")
+        writer.close()
+        await writer.wait_closed()
+
+    async def run():
+        app = SimulationServer()
+        server = await asyncio.start_server(app.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*(client(port) for _ in range(clients)))
+            results["server.state"] = metric(clients * requests / (time.perf_counter() - start), "req/s", "higher")
+
+            # time_to_bottom for `batch` parameter sets sent as float64 rows.
+            rows = np.random.default_rng(0).uniform((0.02, 0.003), (0.1, 0.01), (batch, 2)).T.astype("<f8")
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            head = "POST /batch?fields=m,R_m&format=bin HTTP/1.1\r\nContent-Type: application/octet-stream\r\n"
+            start = time.perf_counter()
+            await request(reader, writer, head, rows.tobytes())
+            results[f"server.batch.{batch}"] = metric((time.perf_counter() - start) * 1000.0, "ms", "lower")
+            writer.close()
+            await writer.wait_closed()
+        finally:
+            # Handlers still waiting for a next request finish before the
+            # loop goes away.
+            server.close()
+            await app.close_connections()
+            await server.wait_closed()
+
+    asyncio.run(run())
+    return results
+
+
+def bench_replay(path):
+    from maxwell_app import app
+    from maxwell_app.session import SessionPlayer
+
+    player = SessionPlayer(path)
+    stamps = []
+    start = time.perf_counter()
+    app.run(fps=0, replay=player, script=lambda frame: stamps.append(time.perf_counter()) or ())
+    total = time.perf_counter() - start
+
+    times = np.diff(stamps) * 1000.0
+    return {
+        "replay.mean": metric(times.mean(), "ms", "lower"),
+        "replay.p95": metric(np.percentile(times, 95), "ms", "lower"),
+        "replay.fps": metric(player.frames / total, "fps", "higher"),
+        "replay.mismatches": metric(player.mismatches, "frames", "lower"),
+    }
+
+
+BENCHMARKS = {
+    "step": bench_step,
+    "graph": bench_graph,
+    "save_plots": bench_save_plots,
+    "frame": bench_frame,
+    "compare": bench_compare,
+    "server": bench_server,
+}
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmarks(names, quick=False, session=None):
+    import pygame
+
+    results = {}
+    for name in names:
+        print(f"running {name}...", file=sys.stderr)
+        results.update(BENCHMARKS[name](quick))
+    if session:
+        print(f"replaying {session}...", file=sys.stderr)
+        results.update(bench_replay(session))
+    meta = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "quick": quick,
+        "session": session,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(baseline, current, threshold):
+    regressions = []
+    lines = []
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or old["value"] == 0:
+            continue
+        change = new["value"] / old["value"] - 1.0
+        worse = -change if new["better"] == "higher" else change
+        flag = "REGRESSION" if worse > threshold else ""
+        if flag:
+            regressions.append(name)
+        lines.append(f"{name:32s} {old['value']:14.4g} -> {new['value']:14.4g} {new['unit']:8s} {change:+8.1%} {flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Замеры производительности колеса Максвелла.")
+    parser.add_argument("--only", help=f"замеры через запятую: {', '.join(BENCHMARKS)} (по умолчанию все)")
+    parser.add_argument("-o", "--output", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON с прошлыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.15, help="допустимое ухудшение, доля (по умолчанию 0.15)")
+    parser.add_argument("--session", help="также воспроизвести записанную сессию (main.py --record) как нагрузку")
+    parser.add_argument("--quick", action="store_true", help="уменьшенные размеры для быстрой проверки")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(",")] if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"неизвестные замеры: {', '.join(unknown)}")
+
+    report = run_benchmarks(names, args.quick, args.session)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, report, args.threshold)
+        print("\n".join(lines), file=sys.stderr)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
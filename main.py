@@ -1,5 +1,82 @@
-from maxwell_app.app import run
+import os
+import sys
+import time
+
+START = time.perf_counter()
+
+
+def report_startup(startup):
+    stages = (
+        ("imports", "import"),
+        ("pygame.init + окно", "display"),
+        ("шрифты", "fonts"),
+        ("интерфейс", "ui"),
+        ("первый кадр", "first_frame"),
+    )
+    last = START
+    for label, key in stages:
+        stamp = startup["run"] if key == "import" else startup[key]
+        print(f"{label:<20} {1000.0 * (stamp - last):8.1f} мс")
+        last = stamp
+    print(f"{'до первого кадра':<20} {1000.0 * (startup['first_frame'] - START):8.1f} мс")
 
 
 if __name__ == "__main__":
-    run()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Симуляция колеса Максвелла.")
+    parser.add_argument("--startup-time", action="store_true", help="показать первый кадр, вывести время запуска по этапам и выйти")
+    parser.add_argument("--record", metavar="FILE", help="записать ввод и шаги симуляции в файл сессии (.jsonl)")
+    parser.add_argument("--replay", metavar="FILE", help="воспроизвести записанную сессию")
+    parser.add_argument("--headless", action="store_true", help="без окна (SDL dummy), например для воспроизведения")
+    parser.add_argument("--fps", type=int, help="ограничение кадров в секунду (при воспроизведении по умолчанию без ограничения)")
+    parser.add_argument("--serve", action="store_true", help="без окна: HTTP/JSON API на --host:--port")
+    parser.add_argument("--host", help="адрес сервера (по умолчанию 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="порт сервера (по умолчанию 8765)")
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record и --replay нельзя использовать вместе")
+
+    if args.serve:
+        # The server needs neither pygame nor a window.
+        from maxwell_app.server import serve
+        from maxwell_app.config import SERVER_HOST, SERVER_PORT
+
+        serve(args.host or SERVER_HOST, args.port or SERVER_PORT)
+        sys.exit(0)
+
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+    # Imported here rather than at the top: worker processes started with
+    # "spawn" re-import this file and do not need pygame.
+    from maxwell_app.app import run
+    from maxwell_app.config import FPS
+
+    if args.startup_time:
+        startup = {}
+        run(fps=0, max_frames=1, startup=startup)
+        report_startup(startup)
+    elif args.replay:
+        from maxwell_app.session import SessionPlayer
+
+        player = SessionPlayer(args.replay)
+        start = time.perf_counter()
+        run(fps=args.fps or 0, replay=player)
+        elapsed = time.perf_counter() - start
+        print(f"replayed {player.frames} frames in {elapsed:.2f} s ({player.frames / max(elapsed, 1e-9):.0f} fps)")
+        if player.mismatches:
+            print(f"state diverged in {player.mismatches} frames, first at frame {player.first_mismatch}")
+            sys.exit(1)
+    elif args.record:
+        from maxwell_app.session import SessionRecorder
+
+        recorder = SessionRecorder(args.record)
+        try:
+            run(fps=args.fps or FPS, record=recorder)
+        finally:
+            recorder.close()
+        print(f"recorded {recorder.frames} frames -> {args.record}")
+    else:
+        run(fps=args.fps or FPS)
@@ -0,0 +1,138 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from .config import FRICTION_REST_DISTANCE
+
+
+WheelState = namedtuple("WheelState", ["t", "h", "v", "omega", "theta", "ep", "ek_t", "ek_r"])
+
+
+class AnalyticMaxwellWheel:
+    def __init__(self, m, R_m, J, h0, g, tau=0.0):
+        self.m = m
+        self.R_m = R_m
+        self.J = J
+        self.h0 = h0
+        self.g = g
+        self.tau = max(0.0, tau)
+
+        self.R = max(R_m, 1e-6)
+        denom = J + m * self.R * self.R
+        if denom > 0:
+            self.a0 = (m * g * self.R * self.R) / denom
+            a_friction = self.tau * self.R / denom
+        else:
+            self.a0 = 0.0
+            a_friction = 0.0
+        # Friction torque opposes rotation: it slows the descent and speeds up
+        # the deceleration on the way back up.
+        self.a_down = self.a0 - a_friction
+        self.a_up = self.a0 + a_friction
+
+        if self.a_down > 0 and h0 > 0:
+            self.time_to_bottom = math.sqrt(2.0 * h0 / self.a_down)
+        else:
+            self.time_to_bottom = None
+
+        if self.time_to_bottom is not None and self.tau == 0.0:
+            self.period = 2.0 * self.time_to_bottom
+        else:
+            self.period = None
+
+        # Legs between turning points: start time, start height, start
+        # velocity, constant acceleration and friction energy lost before the
+        # leg. Built lazily, so memory grows with the number of bounces that
+        # have actually been asked about.
+        self._seg_t = []
+        self._seg_h = []
+        self._seg_v = []
+        self._seg_a = []
+        self._seg_loss = []
+        self._resting = False
+        if self.time_to_bottom is None:
+            self._add_rest(0.0, 0.0, 0.0)
+        elif self.period is None:
+            self._add_segment(0.0, 0.0, 0.0, self.a_down, 0.0)
+
+    @classmethod
+    def from_simulation(cls, sim):
+        return cls.from_params(sim.params)
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(params.m, params.R_m, params.J, params.h0, params.g, params.tau)
+
+    @property
+    def segment_count(self):
+        return len(self._seg_t)
+
+    def _add_segment(self, t, h, v, a, loss):
+        self._seg_t.append(t)
+        self._seg_h.append(h)
+        self._seg_v.append(v)
+        self._seg_a.append(a)
+        self._seg_loss.append(loss)
+
+    def _add_rest(self, t, h, loss):
+        self._add_segment(t, h, 0.0, 0.0, loss)
+        self._resting = True
+
+    def _extend_to(self, t_end):
+        while not self._resting and self._seg_t[-1] <= t_end:
+            t, h, v, a, loss = self._seg_t[-1], self._seg_h[-1], self._seg_v[-1], self._seg_a[-1], self._seg_loss[-1]
+            if v == 0.0:
+                distance = self.h0 - h
+                duration = math.sqrt(2.0 * distance / a)
+                v_bottom = a * duration
+                loss += self.tau * distance / self.R
+                self._add_segment(t + duration, self.h0, -v_bottom, self.a_up, loss)
+            else:
+                duration = -v / a
+                distance = v * v / (2.0 * a)
+                loss += self.tau * distance / self.R
+                if distance < FRICTION_REST_DISTANCE or self.a_down <= 0:
+                    self._add_rest(t + duration, self.h0 - distance, loss)
+                else:
+                    self._add_segment(t + duration, self.h0 - distance, 0.0, self.a_down, loss)
+
+    def _segment_state(self, t):
+        self._extend_to(float(np.max(t)) if t.size else 0.0)
+        starts = np.asarray(self._seg_t)
+        idx = np.searchsorted(starts, t, side="right") - 1
+        idx = np.maximum(idx, 0)
+        dt = np.maximum(t - starts[idx], 0.0)
+        a = np.asarray(self._seg_a)[idx]
+        v0 = np.asarray(self._seg_v)[idx]
+        h0 = np.asarray(self._seg_h)[idx]
+        return h0 + v0 * dt + 0.5 * a * dt * dt, v0 + a * dt, idx
+
+    def energy_lost_at(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        if self.period is not None or self.tau == 0.0:
+            return np.zeros_like(t) if t.ndim else 0.0
+        h, _, idx = self._segment_state(t)
+        lost = np.asarray(self._seg_loss)[idx] + self.tau * np.abs(h - np.asarray(self._seg_h)[idx]) / self.R
+        return lost if t.ndim else float(lost)
+
+    def state_at(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        if self.period is not None:
+            T = self.time_to_bottom
+            phase = np.mod(np.maximum(t, 0.0), self.period)
+            ascending = phase > T
+            s = np.where(ascending, self.period - phase, phase)
+            h = 0.5 * self.a0 * s * s
+            v = np.where(ascending, -self.a0 * s, self.a0 * s)
+        else:
+            h, v, _ = self._segment_state(np.maximum(t, 0.0))
+
+        omega = v / self.R
+        theta = h / self.R
+        ep = self.m * self.g * h
+        ek_t = 0.5 * self.m * v * v
+        ek_r = 0.5 * self.J * omega * omega
+        if t.ndim == 0:
+            return WheelState(float(t), float(h), float(v), float(omega), float(theta), float(ep), float(ek_t), float(ek_r))
+        return WheelState(t, h, v, omega, theta, ep, ek_t, ek_r)
@@ -1,4 +1,7 @@
-import threading
+import os
+import time
+
+import numpy as np
 import pygame
 
 from .config import (
@@ -8,7 +11,6 @@ from .config import (
     LEFT_PANEL_WIDTH,
     RIGHT_PANEL_WIDTH,
     CENTER_PANEL_WIDTH,
-    BACKGROUND_COLOR,
     TEXT_COLOR,
     PANEL_BG_COLOR,
     ROPE_COLOR,
@@ -23,24 +25,52 @@ from .config import (
     PENDULUM_START_Y,
     PIXELS_PER_METER,
     SIM_DT,
+    SIM_SPEED_MIN,
+    SIM_SPEED_MAX,
+    TIMELINE_SPAN,
 )
-from .ui import Button, ParameterControl
+from .ui import Button, Checkbox, ParameterControl, ScrollPanel, Slider, WidgetTree
 from .simulation import MaxwellWheelSimulation
-from .graphs import draw_series_graph
-from .plots import snapshot_history, save_plots
-
+from .analytic import AnalyticMaxwellWheel
+from .integrators import INTEGRATORS
+from .runner import SimulationRunner
+from .compare import Comparison
+from .trajectories import TrajectoryCache
+from .graphs import SeriesGraph, draw_layers, ghost_color
+from .plots import PlotExporter
+from .fonts import load_font
+from .profiler import FrameProfiler
+from .render import DirtyRects, make_background, make_wheel_sprite
+from .textcache import render_text, text_cache
+
+
+def run(fps=FPS, max_frames=None, script=None, startup=None, record=None, replay=None, comparison=None):
+    # startup, when given, receives perf_counter() stamps of the start-up
+    # stages up to the first presented frame. comparison, a Comparison,
+    # starts the window in comparison mode.
+    if startup is not None:
+        startup["run"] = time.perf_counter()
 
-def run():
     pygame.init()
     pygame.display.set_caption("Маятник (Колесо Максвелла)")
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     clock = pygame.time.Clock()
+    if startup is not None:
+        startup["display"] = time.perf_counter()
 
-    font_small = pygame.font.SysFont("arial", 28)
-    font_medium = pygame.font.SysFont("arial", 32)
-    font_large = pygame.font.SysFont("arial", 40)
+    font_small = load_font("arial", 28)
+    font_medium = load_font("arial", 32)
+    font_large = load_font("arial", 40)
+    if startup is not None:
+        startup["fonts"] = time.perf_counter()
 
     sim = MaxwellWheelSimulation()
+    runner = SimulationRunner(sim)
+    runner.comparison = comparison
+    if replay is not None:
+        # The recorded steps only reproduce the run with the step they were
+        # recorded with.
+        runner.dt = replay.dt
 
     left_rect = pygame.Rect(0, 0, LEFT_PANEL_WIDTH, HEIGHT)
     center_rect = pygame.Rect(LEFT_PANEL_WIDTH, 0, CENTER_PANEL_WIDTH, HEIGHT)
@@ -55,14 +85,22 @@ def run():
     btn_y = top_margin + top_title_h + 14
     btn_gap = 10
 
+    # The buttons drive the comparison instead of the single wheel while
+    # one is shown.
     def start_sim():
-        sim.running = True
+        with runner.lock:
+            runner.active.running = True
 
     def pause_sim():
-        sim.running = False
+        with runner.lock:
+            runner.active.running = False
 
     def reset_sim():
-        sim.reset_state(clear_history=True)
+        if runner.comparison is None:
+            new_run(lambda: sim.reset_state(clear_history=True))
+            return
+        with runner.lock:
+            runner.active.reset_state(clear_history=True)
 
     buttons.append(Button((btn_x, btn_y, btn_width, btn_height), "Запустить", font_small, start_sim, icon="play"))
     buttons.append(
@@ -89,122 +127,177 @@ def run():
     save_btn_x = left_rect.x + (left_rect.width - save_btn_width) // 2
     save_btn_y = graph_rect_energy.bottom + 10
 
-    def save_graphs_cb():
-        data = snapshot_history(sim)
-
-        def worker():
-            try:
-                save_plots(data)
-            except Exception as e:
-                print(f"Plot save failed: {e}")
+    exporter = PlotExporter()
 
-        threading.Thread(target=worker, daemon=True).start()
+    def save_graphs_cb():
+        # In comparison mode the plots show every wheel of the comparison.
+        comparison = runner.comparison
+        if comparison is None:
+            exporter.submit(sim.history.snapshot())
+        else:
+            with runner.lock:
+                exporter.submit(comparison.history.snapshot(), list(comparison.colors))
+
+    def export_text(status):
+        if status.state == "queued":
+            return "Графики: в очереди"
+        if status.state == "running":
+            return f"Графики: {status.done}/{status.total}"
+        if status.state == "done":
+            return f"Сохранено в {status.folder}/"
+        if status.state == "failed":
+            return "Ошибка сохранения"
+        if status.state == "empty":
+            return "Нет данных"
+        return ""
 
     buttons.append(Button((save_btn_x, save_btn_y, save_btn_width, save_btn_height), "Скачать график", font_small, save_graphs_cb, icon="save"))
 
+    left_tree = WidgetTree(buttons)
+
     param_controls = []
     param_x = right_rect.x + 20
     param_y = top_margin + top_title_h + 14
     param_width = right_rect.width - 40
     param_gap = 18
-    right_scroll_offset = 0
-    right_scroll_min = 0
-
-    def on_param_change(_):
-        sim.reset_state(clear_history=True)
+    # The controls scroll below the panel title; they are laid out once in
+    # the coordinates of the panel's content surface.
+    right_view = pygame.Rect(right_rect.x, param_y - 6, right_rect.width, right_rect.bottom - (param_y - 6))
+
+    trajectories = TrajectoryCache()
+
+    def change_params(name, value):
+        # The run of the old parameter set is kept; coming back to a set
+        # that was already simulated shows its run again instead of
+        # starting over. Not while recording: a restored run was never
+        # written, and every recording file holds one computed run.
+        def apply():
+            caching = sim.recorder is None
+            if caching and len(sim.history):
+                trajectories.put(sim.trajectory_key(runner.dt), sim.trajectory())
+            if name == "integrator":
+                sim.set_integrator(value)
+            else:
+                setattr(sim, name, value)
+            sim.reset_state(clear_history=True)
+            trajectory = trajectories.get(sim.trajectory_key(runner.dt)) if caching else None
+            if trajectory is not None:
+                sim.restore(trajectory)
+
+        new_run(apply)
 
     def set_m(v):
-        sim.m = v
-        on_param_change(v)
-
-    param_controls.append(
-        ParameterControl(
-            "Масса m",
-            "кг",
-            param_x,
-            0,
-            param_width,
-            font_small,
-            font_small,
-            0.01,
-            1.0,
-            sim.m,
-            on_change=set_m,
-            has_slider=True,
-            log_scale=False,
-        )
+        change_params("m", v)
+
+    m_control = ParameterControl(
+        "Масса m",
+        "кг",
+        param_x,
+        0,
+        param_width,
+        font_small,
+        font_small,
+        0.01,
+        1.0,
+        sim.m,
+        on_change=set_m,
+        has_slider=True,
+        log_scale=False,
+        commit_on_release=True,
     )
+    param_controls.append(m_control)
 
     def set_R_mm(v_mm):
-        sim.R_m = v_mm / 1000.0
-        on_param_change(v_mm)
-
-    param_controls.append(
-        ParameterControl(
-            "Радиус оси R",
-            "мм",
-            param_x,
-            0,
-            param_width,
-            font_small,
-            font_small,
-            2.0,
-            20.0,
-            sim.R_m * 1000.0,
-            on_change=set_R_mm,
-            has_slider=True,
-            log_scale=False,
-        )
+        change_params("R_m", v_mm / 1000.0)
+
+    R_control = ParameterControl(
+        "Радиус оси R",
+        "мм",
+        param_x,
+        0,
+        param_width,
+        font_small,
+        font_small,
+        2.0,
+        20.0,
+        sim.R_m * 1000.0,
+        on_change=set_R_mm,
+        has_slider=True,
+        log_scale=False,
+        commit_on_release=True,
     )
+    param_controls.append(R_control)
 
     def set_J(v):
-        sim.J = v
-        on_param_change(v)
-
-    param_controls.append(
-        ParameterControl(
-            "Момент инерции J",
-            "кг·м²",
-            param_x,
-            0,
-            param_width,
-            font_small,
-            font_small,
-            1e-5,
-            1e-3,
-            sim.J,
-            on_change=set_J,
-            has_slider=True,
-            log_scale=True,
-        )
+        change_params("J", v)
+
+    J_control = ParameterControl(
+        "Момент инерции J",
+        "кг·м²",
+        param_x,
+        0,
+        param_width,
+        font_small,
+        font_small,
+        1e-5,
+        1e-3,
+        sim.J,
+        on_change=set_J,
+        has_slider=True,
+        log_scale=True,
+        commit_on_release=True,
+    )
+    param_controls.append(J_control)
+
+    def set_tau(v):
+        change_params("tau", v)
+
+    tau_control = ParameterControl(
+        "Трение τтр",
+        "Н·м",
+        param_x,
+        0,
+        param_width,
+        font_small,
+        font_small,
+        0.0,
+        0.005,
+        sim.tau,
+        on_change=set_tau,
+        has_slider=True,
+        log_scale=False,
+        commit_on_release=True,
     )
+    param_controls.append(tau_control)
 
+    def set_friction(checked):
+        change_params("friction_enabled", checked)
+
+    friction_checkbox = Checkbox((param_x, 0, param_width, 36), "Учитывать трение", font_small, sim.friction_enabled, set_friction)
 
     def set_h0(v):
-        sim.h0 = v
-        on_param_change(v)
-
-    param_controls.append(
-        ParameterControl(
-            "Начальная высота h₀",
-            "м",
-            param_x,
-            0,
-            param_width,
-            font_small,
-            font_small,
-            0.0,
-            1.0,
-            sim.h0,
-            on_change=set_h0,
-            has_slider=True,
-            log_scale=False,
-        )
+        change_params("h0", v)
+
+    h0_control = ParameterControl(
+        "Начальная высота h₀",
+        "м",
+        param_x,
+        0,
+        param_width,
+        font_small,
+        font_small,
+        0.0,
+        1.0,
+        sim.h0,
+        on_change=set_h0,
+        has_slider=True,
+        log_scale=False,
+        commit_on_release=True,
     )
+    param_controls.append(h0_control)
 
     def set_g(v):
-        sim.g = v
-        on_param_change(v)
+        change_params("g", v)
 
     g_control = ParameterControl(
         "Ускорение свободного падения g",
@@ -220,176 +313,626 @@ def run():
         on_change=set_g,
         has_slider=True,
         log_scale=False,
+        commit_on_release=True,
     )
     param_controls.append(g_control)
 
-    def layout_right_panel(scroll_offset):
-        nonlocal right_scroll_min
-        y = param_y + scroll_offset
-        # no friction checkbox insertion (ideal model)
-        content_bottom = y
-        for ctrl in param_controls:
-            if ctrl is g_control:
-                y += 24
-            ctrl.set_position(param_x, y)
-            y += ctrl.get_height() + param_gap
-            content_bottom = max(content_bottom, y)
-            
-
-        available_h = right_rect.height - (param_y + 20)
-        content_h = content_bottom - param_y
-        if content_h <= available_h:
-            right_scroll_min = 0
-        else:
-            right_scroll_min = available_h - content_h
-
-    layout_right_panel(right_scroll_offset)
-
-    time_accumulator = 0.0
+    # Slider, simulation attribute and the divisor from slider units.
+    preview_fields = (
+        (m_control, "m", 1.0),
+        (R_control, "R_m", 1000.0),
+        (J_control, "J", 1.0),
+        (tau_control, "tau", 1.0),
+        (h0_control, "h0", 1.0),
+        (g_control, "g", 1.0),
+    )
 
-    running = True
-    while running:
-        dt_real = clock.tick(FPS) / 1000.0
-        time_accumulator += dt_real
+    def preview_params():
+        # The current parameters with the value of the slider being dragged,
+        # or None when no slider is dragged.
+        for ctrl, name, scale in preview_fields:
+            if ctrl.pending is not None:
+                value = ctrl.pending / scale
+                with runner.lock:
+                    if name == "tau" and not sim.friction_enabled:
+                        value = 0.0
+                    return sim.params.replace(**{name: value})
+        return None
+
+    def make_ghost(params, t_end):
+        # Exact solution on the simulation's time grid, computed in one
+        # vectorized pass: at least one descent and return, or as long as
+        # the current run.
+        engine = AnalyticMaxwellWheel.from_params(params)
+        ttb = engine.time_to_bottom
+        span = min(TIMELINE_SPAN, max(t_end, 2.0 * ttb if ttb is not None else 1.0))
+        return params, ttb, engine.state_at(SIM_DT * np.arange(1, int(span / SIM_DT) + 1))
+
+    def set_speed(v):
+        if not fast_checkbox.checked:
+            runner.speed = v
+
+    speed_control = ParameterControl(
+        "Скорость симуляции",
+        "×",
+        param_x,
+        0,
+        param_width,
+        font_small,
+        font_small,
+        SIM_SPEED_MIN,
+        SIM_SPEED_MAX,
+        1.0,
+        on_change=set_speed,
+        has_slider=True,
+        log_scale=True,
+    )
+    param_controls.append(speed_control)
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+    def set_fast(checked):
+        runner.speed = None if checked else speed_control.value
 
-            if event.type == pygame.MOUSEWHEEL:
-                mx, my = pygame.mouse.get_pos()
-                if right_rect.collidepoint((mx, my)):
-                    right_scroll_offset += int(event.y * 40)
-                    right_scroll_offset = max(right_scroll_min, min(0, right_scroll_offset))
-                    layout_right_panel(right_scroll_offset)
+    fast_checkbox = Checkbox((param_x, 0, param_width, 36), "Максимально быстро", font_small, False, set_fast)
 
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button in (4, 5):
-                mx, my = event.pos
-                if right_rect.collidepoint((mx, my)):
-                    right_scroll_offset += 40 if event.button == 4 else -40
-                    right_scroll_offset = max(right_scroll_min, min(0, right_scroll_offset))
-                    layout_right_panel(right_scroll_offset)
+    def method_text():
+        return f"Метод: {sim.integrator.label}"
 
-            for btn in buttons:
-                btn.handle_event(event)
-            for ctrl in param_controls:
-                ctrl.handle_event(event)
-            
+    def cycle_method():
+        names = list(INTEGRATORS)
+        change_params("integrator", names[(names.index(sim.integrator.name) + 1) % len(names)])
+        method_button.text = method_text()
 
-        while time_accumulator >= SIM_DT:
-            sim.step(SIM_DT)
-            time_accumulator -= SIM_DT
+    method_button = Button((param_x, 0, param_width, 50), method_text(), font_small, cycle_method)
 
-        screen.fill(BACKGROUND_COLOR)
+    def open_recorder():
+        from .recorder import Recorder
 
-        pygame.draw.rect(screen, PANEL_BG_COLOR, left_rect)
-        pygame.draw.rect(screen, PANEL_BG_COLOR, center_rect)
-        pygame.draw.rect(screen, PANEL_BG_COLOR, right_rect)
+        # Runs started within the same second get a numbered file each.
+        stamp = time.strftime("recordings/run-%Y%m%d-%H%M%S")
+        path, n = f"{stamp}.csv", 1
+        while os.path.exists(path):
+            path, n = f"{stamp}-{n}.csv", n + 1
+        return Recorder(path)
 
-        for btn in buttons:
-            btn.draw(screen)
+    def close_recorder(recorder):
+        if recorder is not None:
+            try:
+                recorder.close()
+            except Exception as e:
+                print(f"Recording failed: {e}")
+
+    def new_run(reset):
+        # A reset starts a new run, and while recording a new file: the
+        # recorder is swapped in the same locked step, before the reset, so
+        # no sample of the old run reaches the new file or the other way
+        # round.
+        recorder = None
+        if sim.recorder is not None:
+            try:
+                recorder = open_recorder()
+            except OSError as e:
+                print(f"Recording failed: {e}")
+                record_checkbox.checked = False
+        with runner.lock:
+            previous, sim.recorder = sim.recorder, recorder
+            reset()
+        close_recorder(previous)
+
+    def stop_recording():
+        with runner.lock:
+            recorder, sim.recorder = sim.recorder, None
+        close_recorder(recorder)
+
+    def set_recording(checked):
+        if not checked:
+            stop_recording()
+            return
+        try:
+            recorder = open_recorder()
+        except OSError as e:
+            print(f"Recording failed: {e}")
+            record_checkbox.checked = False
+            return
+        with runner.lock:
+            sim.recorder = recorder
+
+    record_checkbox = Checkbox((param_x, 0, param_width, 36), "Запись на диск", font_small, False, set_recording)
+
+    def compare_text():
+        return f"Сбросить сравнение ({len(runner.comparison)})" if runner.comparison is not None else "Сравнение выключено"
+
+    def add_to_comparison():
+        with runner.lock:
+            if runner.comparison is None:
+                runner.comparison = Comparison()
+            runner.comparison.add(sim.params)
+        compare_clear_button.text = compare_text()
+
+    def clear_comparison():
+        with runner.lock:
+            runner.comparison = None
+        compare_clear_button.text = compare_text()
+
+    compare_add_button = Button((param_x, 0, param_width, 50), "Добавить в сравнение", font_small, add_to_comparison)
+    compare_clear_button = Button((param_x, 0, param_width, 50), compare_text(), font_small, clear_comparison)
+
+    def layout_right_panel():
+        x = param_x - right_view.x
+        y = param_y - right_view.y
+        content_bottom = y
+        for ctrl in param_controls:
+            if ctrl is g_control or ctrl is speed_control:
+                y += 24
+            ctrl.set_position(x, y)
+            y += ctrl.get_height() + param_gap
+            if ctrl is tau_control:
+                friction_checkbox.set_position(x, y - param_gap // 2)
+                y += friction_checkbox.rect.height + param_gap
+            content_bottom = max(content_bottom, y)
 
-        if sim.time_history:
-            draw_series_graph(
+        fast_checkbox.set_position(x, y)
+        y += fast_checkbox.rect.height + param_gap
+
+        method_button.rect.topleft = (x, y)
+        y += method_button.rect.height + param_gap
+
+        record_checkbox.set_position(x, y)
+        y += record_checkbox.rect.height + param_gap
+
+        compare_add_button.rect.topleft = (x, y)
+        y += compare_add_button.rect.height + param_gap
+        compare_clear_button.rect.topleft = (x, y)
+        y += compare_clear_button.rect.height + param_gap
+        content_bottom = max(content_bottom, y)
+        return content_bottom + 20
+
+    right_widgets = param_controls[:4] + [friction_checkbox] + param_controls[4:] + [
+        fast_checkbox,
+        method_button,
+        record_checkbox,
+        compare_add_button,
+        compare_clear_button,
+    ]
+    right_panel = ScrollPanel(right_view, layout_right_panel(), right_widgets)
+
+    timeline_label = font_small.render("Время", True, TEXT_COLOR)
+    timeline_y = center_rect.bottom - 40
+    timeline_label_rect = timeline_label.get_rect(midleft=(center_rect.x + 40, timeline_y))
+    timeline_x = timeline_label_rect.right + 20
+    timeline = Slider((timeline_x, timeline_y - 9, center_rect.right - 40 - timeline_x, 18), value=0.0)
+
+    title_left = font_large.render("Управление", True, TEXT_COLOR)
+    title_center = font_large.render("Симуляция колеса Максвелла", True, TEXT_COLOR)
+    title_right = font_large.render("Параметры", True, TEXT_COLOR)
+    title_left_pos = (left_rect.x + 20, top_margin)
+    title_center_rect = title_center.get_rect(center=(center_rect.centerx, top_margin + title_center.get_height() // 2))
+    title_right_pos = (right_rect.x + 20, top_margin)
+
+    cx = center_rect.centerx
+    bar_half = 200
+    bar_y = PENDULUM_BAR_Y
+    rope_offset = 40
+
+    background = make_background(
+        (WIDTH, HEIGHT),
+        [left_rect, center_rect, right_rect],
+        blits=[
+            (title_left, title_left_pos),
+            (title_center, title_center_rect),
+            (title_right, title_right_pos),
+            (timeline_label, timeline_label_rect),
+        ],
+        lines=[(BAR_COLOR, (cx - bar_half, bar_y), (cx + bar_half, bar_y), 8)],
+    ).convert()
+    wheel_sprite = make_wheel_sprite(PENDULUM_RADIUS_PIXELS).convert_alpha()
+    wheel_half = wheel_sprite.get_width() // 2
+
+    legend_pad = 8
+    legend_line_h = font_small.get_height() + 4
+    line_step = font_medium.get_height() + 8
+    export_rect = pygame.Rect(btn_x, btn_y + 3 * (btn_height + btn_gap) + 4, btn_width, font_small.get_height())
+    drift_rect = pygame.Rect(center_rect.x + 20, PENDULUM_BAR_Y - font_small.get_height() // 2, cx - bar_half - center_rect.x - 40, font_small.get_height())
+
+    dirty = DirtyRects()
+    drawn = {}
+
+    def changed(name, key):
+        if not dirty.full and drawn.get(name) == key:
+            return False
+        drawn[name] = key
+        return True
+
+    def restore(rect):
+        screen.blit(background, rect, rect)
+        dirty.add(rect)
+
+    def draw_legend(graph_rect, items):
+        for idx, (color, text) in enumerate(items):
+            lx = graph_rect.x + legend_pad
+            ly = graph_rect.y + legend_pad + idx * legend_line_h
+            text_w, text_h = text_cache.size(font_small, text)
+            bg_rect = pygame.Rect(lx - 4, ly - 2, 26 + text_w + 8, text_h + 4)
+            pygame.draw.rect(screen, PANEL_BG_COLOR, bg_rect)
+            pygame.draw.rect(screen, color, (lx, ly + (text_h // 2) - 4, 20, 8))
+            txt = render_text(font_small, text, TEXT_COLOR)
+            screen.blit(txt, (lx + 26, ly))
+
+    graph_hv = SeriesGraph(graph_rect_hv, [COLOR_HEIGHT, COLOR_VELOCITY])
+    graph_energy = SeriesGraph(graph_rect_energy, [COLOR_EP, COLOR_EK_TRANS, COLOR_EK_ROT])
+    ghost = None
+
+    hv_colors = [COLOR_HEIGHT, COLOR_VELOCITY]
+    energy_colors = [COLOR_EP, COLOR_EK_TRANS, COLOR_EK_ROT]
+    ghost_hv_colors = [ghost_color(color) for color in hv_colors]
+    ghost_energy_colors = [ghost_color(color) for color in energy_colors]
+
+    def draw_graphs(state, ghost):
+        history = state.history
+        graph_hv.update(history["t"], [history["h"], history["v"]], history.generation)
+        graph_energy.update(history["t"], [history["ep"], history["ek_t"], history["ek_r"]], history.generation)
+
+        restore(graph_rect_hv)
+        restore(graph_rect_energy)
+        if ghost is not None:
+            # The prediction is dimmed, under the current run, on a scale
+            # that fits both.
+            predicted = ghost[2]
+            draw_layers(
                 screen,
                 graph_rect_hv,
-                sim.time_history,
-                [sim.h_history, sim.v_history],
-                [COLOR_HEIGHT, COLOR_VELOCITY],
+                [
+                    (predicted.t, [predicted.h, predicted.v], ghost_hv_colors),
+                    (history["t"], [history["h"], history["v"]], hv_colors),
+                ],
             )
-            draw_series_graph(
+            draw_layers(
                 screen,
                 graph_rect_energy,
-                sim.time_history,
-                [sim.ep_history, sim.ek_trans_history, sim.ek_rot_history],
-                [COLOR_EP, COLOR_EK_TRANS, COLOR_EK_ROT],
+                [
+                    (predicted.t, [predicted.ep, predicted.ek_t, predicted.ek_r], ghost_energy_colors),
+                    (history["t"], [history["ep"], history["ek_t"], history["ek_r"]], energy_colors),
+                ],
             )
+        elif len(history):
+            graph_hv.draw(screen)
+            graph_energy.draw(screen)
+        else:
+            return
+        draw_legend(graph_rect_hv, [(COLOR_HEIGHT, "h(t)"), (COLOR_VELOCITY, "v(t)")])
+        draw_legend(graph_rect_energy, [(COLOR_EP, "Ep"), (COLOR_EK_TRANS, "Ek пост."), (COLOR_EK_ROT, "Ek вр.")])
+
+    compare_graphs = None
+
+    def draw_compare_graphs(comparison):
+        # Every wheel in its own color: h and Ep solid, v and the kinetic
+        # energy dimmed.
+        nonlocal compare_graphs
+        if compare_graphs is None or compare_graphs[0] != comparison.params:
+            colors = list(comparison.colors) + [ghost_color(color) for color in comparison.colors]
+            compare_graphs = (comparison.params, SeriesGraph(graph_rect_hv, colors), SeriesGraph(graph_rect_energy, colors))
+        _, hv, energy = compare_graphs
+        history = comparison.history
+        generation = (comparison.generation, history.generation)
+        if len(history):
+            times = history["t"][0]
+            hv.update(times, [*history["h"], *history["v"]], generation)
+            energy.update(times, [*history["ep"], *(history["ek_t"] + history["ek_r"])], generation)
+
+        restore(graph_rect_hv)
+        restore(graph_rect_energy)
+        if not len(history):
+            return
+        hv.draw(screen)
+        energy.draw(screen)
+        draw_legend(graph_rect_hv, [(TEXT_COLOR, "h(t)"), (ghost_color(TEXT_COLOR), "v(t)")])
+        draw_legend(graph_rect_energy, [(TEXT_COLOR, "Ep"), (ghost_color(TEXT_COLOR), "Ek")])
+
+    compare_left = drift_rect.x
+    compare_right = center_rect.right - 20
+    compare_sprites = {}
+
+    def compare_layout(count):
+        # The wheels share the width of the center panel and shrink as more
+        # are added.
+        spacing = (compare_right - compare_left) / count
+        radius = int(max(6, min(PENDULUM_RADIUS_PIXELS, spacing * 0.4)))
+        return [int(compare_left + spacing * (i + 0.5)) for i in range(count)], radius
+
+    def compare_positions(comparison):
+        y = PENDULUM_START_Y + np.minimum(comparison.h, comparison.h0) * PIXELS_PER_METER
+        return tuple(y.astype(int).tolist())
+
+    def draw_wheels(comparison, ys, h0):
+        xs, radius = compare_layout(len(ys))
+        if radius not in compare_sprites:
+            compare_sprites[radius] = make_wheel_sprite(radius).convert_alpha()
+        sprite = compare_sprites[radius]
+        half = sprite.get_width() // 2
+
+        bottom = PENDULUM_START_Y + int(h0 * PIXELS_PER_METER) + half + 2
+        restore(pygame.Rect(compare_left - half, bar_y - 4, compare_right - compare_left + 2 * half, bottom - (bar_y - 4)))
+        drawn.pop("profile", None)
+        pygame.draw.line(screen, BAR_COLOR, (xs[0] - radius, bar_y), (xs[-1] + radius, bar_y), 8)
+        for x, y, color in zip(xs, ys, comparison.colors):
+            pygame.draw.line(screen, ROPE_COLOR, (x, bar_y), (x, y - radius), 1)
+            screen.blit(sprite, (x - half, y - half))
+            pygame.draw.circle(screen, color, (x, y), radius, 2)
+
+    def compare_info(comparison):
+        ttb = comparison.time_to_bottom
+        done = np.isfinite(ttb)
+        count = len(comparison.params)
+        return (
+            f"Сравнение: {count} шт.",
+            f"t = {comparison.t:.2f} с",
+            f"Достигли низа: {int(done.sum())}/{count}",
+            f"T min = {np.min(ttb[done]):.3f} с" if done.any() else "T min = —",
+            f"T max = {np.max(ttb):.3f} с" if done.all() else "T max = —",
+        )
 
-            legend_pad = 8
-            legend_line_h = font_small.get_height() + 4
-
-            legend_items_hv = [
-                (COLOR_HEIGHT, "h(t)"),
-                (COLOR_VELOCITY, "v(t)"),
-            ]
-            for idx, (color, text) in enumerate(legend_items_hv):
-                lx = graph_rect_hv.x + legend_pad
-                ly = graph_rect_hv.y + legend_pad + idx * legend_line_h
-                text_w, text_h = font_small.size(text)
-                bg_rect = pygame.Rect(lx - 4, ly - 2, 26 + text_w + 8, text_h + 4)
-                pygame.draw.rect(screen, PANEL_BG_COLOR, bg_rect)
-                pygame.draw.rect(screen, color, (lx, ly + (text_h // 2) - 4, 20, 8))
-                txt = font_small.render(text, True, TEXT_COLOR)
-                screen.blit(txt, (lx + 26, ly))
-
-            legend_items_energy = [
-                (COLOR_EP, "Ep"),
-                (COLOR_EK_TRANS, "Ek пост."),
-                (COLOR_EK_ROT, "Ek вр."),
-            ]
-            for idx, (color, text) in enumerate(legend_items_energy):
-                lx = graph_rect_energy.x + legend_pad
-                ly = graph_rect_energy.y + legend_pad + idx * legend_line_h
-                text_w, text_h = font_small.size(text)
-                bg_rect = pygame.Rect(lx - 4, ly - 2, 26 + text_w + 8, text_h + 4)
-                pygame.draw.rect(screen, PANEL_BG_COLOR, bg_rect)
-                pygame.draw.rect(screen, color, (lx, ly + (text_h // 2) - 4, 20, 8))
-                txt = font_small.render(text, True, TEXT_COLOR)
-                screen.blit(txt, (lx + 26, ly))
-
-        cx = center_rect.centerx
-        bar_half = 200
-        bar_y = PENDULUM_BAR_Y
-        pygame.draw.line(screen, BAR_COLOR, (cx - bar_half, bar_y), (cx + bar_half, bar_y), 8)
-
-        rope_offset = 40
-        rope_top_left = (cx - rope_offset, bar_y)
-        rope_top_right = (cx + rope_offset, bar_y)
-
-        pendulum_y = PENDULUM_START_Y + sim.h * PIXELS_PER_METER
-        pendulum_y = min(pendulum_y, PENDULUM_START_Y + sim.h0 * PIXELS_PER_METER)
-
-        rope_bottom_left = (cx - rope_offset, pendulum_y - PENDULUM_RADIUS_PIXELS)
-        rope_bottom_right = (cx + rope_offset, pendulum_y - PENDULUM_RADIUS_PIXELS)
-
-        pygame.draw.line(screen, ROPE_COLOR, rope_top_left, rope_bottom_left, 2)
-        pygame.draw.line(screen, ROPE_COLOR, rope_top_right, rope_bottom_right, 2)
-
-        for i in range(PENDULUM_RADIUS_PIXELS, 0, -4):
-            f = i / PENDULUM_RADIUS_PIXELS
-            r = int(0xC0 * f + 0x80 * (1 - f))
-            g = int(0xC0 * f + 0x80 * (1 - f))
-            b = int(0xC0 * f + 0x80 * (1 - f))
-            pygame.draw.circle(screen, (r, g, b), (cx, int(pendulum_y)), i)
-
-        pygame.draw.circle(screen, (50, 50, 50), (cx, int(pendulum_y)), PENDULUM_RADIUS_PIXELS, 2)
-
-        info_y = PENDULUM_START_Y + int(sim.h0 * PIXELS_PER_METER) + 80
-        text_lines = [
-            f"h = {sim.h:.2f} м",
-            f"v = {sim.v:.2f} м/с",
-            f"ω = {sim.omega:.2f} рад/с",
-            f"t = {sim.t:.2f} с",
-            f"T = {(sim.time_to_bottom if sim.time_to_bottom is not None else float('nan')):.3f} с" if sim.time_to_bottom is not None else "T = —",
-        ]
-        line_step = font_medium.get_height() + 8
+    def draw_wheel(pendulum_y, h0):
+        bottom = PENDULUM_START_Y + int(h0 * PIXELS_PER_METER) + wheel_half + 2
+        half_w = max(rope_offset, wheel_half) + 2
+        restore(pygame.Rect(cx - half_w, bar_y - 4, 2 * half_w + 1, bottom - (bar_y - 4)))
+
+        rope_bottom_y = pendulum_y - PENDULUM_RADIUS_PIXELS
+        pygame.draw.line(screen, ROPE_COLOR, (cx - rope_offset, bar_y), (cx - rope_offset, rope_bottom_y), 2)
+        pygame.draw.line(screen, ROPE_COLOR, (cx + rope_offset, bar_y), (cx + rope_offset, rope_bottom_y), 2)
+        screen.blit(wheel_sprite, (cx - wheel_half, pendulum_y - wheel_half))
+
+    def draw_info(text_lines, h0):
+        info_y = PENDULUM_START_Y + int(h0 * PIXELS_PER_METER) + 80
+        restore(pygame.Rect(center_rect.x, info_y - line_step // 2, center_rect.width, line_step * len(text_lines)))
+        # The cleared band spans the whole center panel, including the
+        # profiler box when it is shown.
+        drawn.pop("profile", None)
         for i, line in enumerate(text_lines):
-            txt = font_medium.render(line, True, TEXT_COLOR)
+            txt = render_text(font_medium, line, TEXT_COLOR)
             txt_rect = txt.get_rect(center=(center_rect.centerx, info_y + i * line_step))
             screen.blit(txt, txt_rect)
 
-        for ctrl in param_controls:
-            ctrl.draw(screen)
-        
+    profiler = FrameProfiler()
+    font_profile = load_font("arial", 22)
+    profile_line_h = font_profile.get_height()
+    profile_phases = (
+        ("wait", "ожидание"),
+        ("events", "события"),
+        ("snapshot", "снимок"),
+        ("preview", "предпросмотр"),
+        ("graphs", "графики"),
+        ("wheel", "колесо"),
+        ("text", "текст"),
+        ("panels", "панели"),
+        ("overlay", "оверлей"),
+        ("present", "вывод"),
+        ("sim", "симуляция*"),
+    )
+    profile_rect = pygame.Rect(center_rect.right - 300, PENDULUM_BAR_Y + 20, 290, profile_line_h * (len(profile_phases) + 4) + 8)
+    show_profile = False
+    profile_lines = ()
+    last_steps = runner.steps_total
+    last_busy = runner.busy_time
+
+    profile_columns = (profile_rect.x + 8, profile_rect.x + 190, profile_rect.right - 10)
+
+    def draw_profile(rows):
+        restore(profile_rect)
+        pygame.draw.rect(screen, PANEL_BG_COLOR, profile_rect)
+        pygame.draw.rect(screen, BAR_COLOR, profile_rect, 1)
+        for i, row in enumerate(rows):
+            y = profile_rect.y + 4 + i * profile_line_h
+            for j, cell in enumerate(row):
+                txt = render_text(font_profile, cell, TEXT_COLOR)
+                # The label is left-aligned, the numbers right-aligned.
+                x = profile_columns[0] if j == 0 else profile_columns[j] - txt.get_width()
+                screen.blit(txt, (x, y))
+
+    def profile_text(history_len):
+        stats = profiler.stats()
+        rows = [("мс", "p50", "p99")]
+        for phase, label in profile_phases:
+            if phase in stats:
+                p50, p99 = stats[phase]
+                rows.append((label, f"{p50:.2f}", f"{p99:.2f}"))
+        rows.append(("шагов за кадр", "", str(profiler.latest("steps"))))
+        rows.append(("история", "", str(history_len)))
+        rows.append(("* поток симуляции",))
+        return tuple(rows)
+
+    # Recording and replay step the simulation from this loop, after the
+    # frame's events, so a replay sees input and steps in the same order.
+    synchronous = record is not None or replay is not None
+    if not synchronous:
+        runner.start()
+    mouse_pos = (0, 0)
+    seek_pending = False
+    if startup is not None:
+        startup["ui"] = time.perf_counter()
+
+    running = True
+    frame = 0
+    while running:
+        profiler.begin_frame()
+        clock.tick(fps)
+        profiler.mark("wait")
+
+        events = pygame.event.get()
+        if replay is not None:
+            # Live input is ignored during a replay, except closing the window.
+            events = [event for event in events if event.type == pygame.QUIT]
+            events.extend(replay.events(frame))
+        if script is not None:
+            # Scripted input for headless runs: extra events for this frame.
+            events.extend(script(frame))
+        # Of consecutive motion events only the last one matters; a fast
+        # drag can queue many per frame.
+        events = [
+            event
+            for i, event in enumerate(events)
+            if not (event.type == pygame.MOUSEMOTION and i + 1 < len(events) and events[i + 1].type == pygame.MOUSEMOTION)
+        ]
+        index = frame
+        frame += 1
+        if max_frames is not None and frame >= max_frames:
+            running = False
+        if replay is not None and frame >= replay.frames:
+            running = False
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
 
-        title_left = font_large.render("Управление", True, TEXT_COLOR)
-        screen.blit(title_left, (left_rect.x + 20, top_margin))
-        title_center = font_large.render("Симуляция колеса Максвелла", True, TEXT_COLOR)
-        tc_rect = title_center.get_rect(center=(center_rect.centerx, top_margin + title_center.get_height() // 2))
-        screen.blit(title_center, tc_rect)
-        title_right = font_large.render("Параметры", True, TEXT_COLOR)
-        screen.blit(title_right, (right_rect.x + 20, top_margin))
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_profile = not show_profile
+                if not show_profile:
+                    restore(profile_rect)
+                    dirty.invalidate()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                path = profiler.dump(time.strftime("profiles/frames-%Y%m%d-%H%M%S.json"))
+                print(f"Frame timings saved to {path}")
 
-        pygame.display.flip()
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                dirty.invalidate()
 
+            if event.type == pygame.MOUSEMOTION:
+                mouse_pos = event.pos
+
+            if event.type == pygame.MOUSEWHEEL:
+                # Wheel events carry no position; the last motion event is
+                # used instead of polling the mouse, so replays match.
+                if right_rect.collidepoint(mouse_pos):
+                    right_panel.scroll_by(int(event.y * 40))
+
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button in (4, 5):
+                if right_rect.collidepoint(event.pos):
+                    right_panel.scroll_by(40 if event.button == 4 else -40)
+
+            left_tree.handle_event(event)
+            right_panel.handle_event(event)
+            if timeline.handle_event(event) and runner.comparison is None:
+                seek_pending = True
+            # A seek replaces the run. While recording it is applied once the
+            # knob is released, and the recording goes on in a new file that
+            # starts with the samples up to the seek point.
+            if seek_pending and sim.recorder is None:
+                seek_pending = False
+                with runner.lock:
+                    sim.seek(timeline.value * TIMELINE_SPAN, runner.dt)
+            elif seek_pending and not timeline.dragging:
+                seek_pending = False
+                new_run(lambda: sim.seek(timeline.value * TIMELINE_SPAN, runner.dt))
+
+        profiler.mark("events")
+        if replay is not None:
+            runner.advance_steps(replay.steps(index))
+            profiler.mark("sim")
+        elif record is not None:
+            runner.advance(clock.get_time() / 1000.0)
+            profiler.mark("sim")
+
+        state = runner.snapshot()
+        profiler.mark("snapshot")
+        if record is not None:
+            record.frame(index, events, runner.steps_last, state.t, state.h)
+        elif replay is not None:
+            replay.check(index, state.t, state.h)
+
+        comparing = state.comparison
+        scene_h0 = state.h0 if comparing is None else float(np.max(comparing.h0))
+        if changed("scene", (None if comparing is None else len(comparing.params), scene_h0)):
+            dirty.invalidate()
+        if dirty.full:
+            screen.blit(background, (0, 0))
+            left_tree.invalidate()
+            right_panel.invalidate()
+
+        for rect in left_tree.draw(screen, background):
+            dirty.add(rect)
+        profiler.mark("panels")
+
+        ghost_params = preview_params() if comparing is None else None
+        if ghost_params is None:
+            ghost = None
+        elif ghost is None or ghost[0] != ghost_params:
+            ghost = make_ghost(ghost_params, state.t)
+        profiler.mark("preview")
+
+        if comparing is not None:
+            if changed("graphs", ("compare", comparing.generation, comparing.history.seq)):
+                draw_compare_graphs(comparing)
+        elif changed("graphs", (state.history.generation, state.history.seq, ghost_params)):
+            draw_graphs(state, ghost)
+        profiler.mark("graphs")
+
+        if comparing is not None:
+            ys = compare_positions(comparing)
+            if changed("wheel", ys):
+                draw_wheels(comparing, ys, scene_h0)
+        else:
+            pendulum_y = PENDULUM_START_Y + state.h * PIXELS_PER_METER
+            pendulum_y = int(min(pendulum_y, PENDULUM_START_Y + state.h0 * PIXELS_PER_METER))
+            if changed("wheel", pendulum_y):
+                draw_wheel(pendulum_y, state.h0)
+        profiler.mark("wheel")
+
+        if comparing is not None:
+            text_lines = compare_info(comparing)
+        else:
+            text_lines = (
+                f"h = {state.h:.2f} м",
+                f"v = {state.v:.2f} м/с",
+                f"ω = {state.omega:.2f} рад/с",
+                f"t = {state.t:.2f} с",
+                (f"T = {state.time_to_bottom:.3f} с" if state.time_to_bottom is not None else "T = —")
+                + ("" if ghost is None else f" » {ghost[1]:.3f} с" if ghost[1] is not None else " » —"),
+            )
+        if changed("info", text_lines):
+            draw_info(text_lines, scene_h0)
+
+        # The drift is that of the single wheel; its place is taken by the
+        # compared wheels.
+        drift_text = f"ΔE = {state.energy_drift * 100:.3f} %" if comparing is None else ""
+        if changed("drift", drift_text):
+            restore(drift_rect)
+            screen.blit(render_text(font_small, drift_text, TEXT_COLOR), drift_rect)
+
+        status_text = export_text(exporter.status)
+        if changed("export", status_text):
+            restore(export_rect)
+            screen.blit(render_text(font_small, status_text, TEXT_COLOR), export_rect)
+        profiler.mark("text")
+
+        if not timeline.dragging:
+            timeline.value = min(1.0, (state.t if comparing is None else comparing.t) / TIMELINE_SPAN)
+        if changed("timeline", timeline.value):
+            restore(timeline.rect.inflate(16, 4))
+            timeline.draw(screen)
+
+        for rect in right_panel.draw(screen):
+            dirty.add(rect)
+        profiler.mark("panels")
+
+        if show_profile:
+            # Percentiles over the whole window are recomputed a few times a
+            # second; the box itself is cheap to redraw from the text cache.
+            if frame % 15 == 1 or not profile_lines:
+                profile_lines = profile_text(len(state.history))
+            if changed("profile", profile_lines):
+                draw_profile(profile_lines)
+        profiler.mark("overlay")
+
+        dirty.present()
+        profiler.mark("present")
+        if startup is not None and "first_frame" not in startup:
+            startup["first_frame"] = time.perf_counter()
+
+        steps_total, busy = runner.steps_total, runner.busy_time
+        if not synchronous:
+            profiler.add("sim", busy - last_busy)
+        profiler.end_frame(steps=steps_total - last_steps, history=len(state.history))
+        last_steps, last_busy = steps_total, busy
+
+    runner.stop()
+    stop_recording()
+    exporter.close()
     pygame.quit()
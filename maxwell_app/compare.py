@@ -0,0 +1,91 @@
+import colorsys
+from collections import namedtuple
+
+import numpy as np
+
+from .config import COMPARE_HISTORY_CAP, COMPARE_MAX_WHEELS
+from .history import BatchHistory
+from .simulation import BatchMaxwellSimulation
+
+
+ComparisonSnapshot = namedtuple(
+    "ComparisonSnapshot",
+    ["params", "colors", "generation", "t", "h", "v", "omega", "time_to_bottom", "h0", "running", "history"],
+)
+
+
+def wheel_colors(count):
+    # Evenly spaced hues, light enough to read on the dark panels.
+    return [tuple(int(255 * c) for c in colorsys.hsv_to_rgb(i / max(count, 1), 0.6, 1.0)) for i in range(count)]
+
+
+class Comparison:
+    # Several parameter sets run side by side. All wheels advance in one
+    # BatchMaxwellSimulation step, so the cost of a step barely depends on
+    # how many there are. It has the running / step / reset_state interface
+    # the runner uses for a single simulation.
+    def __init__(self, params=(), max_wheels=COMPARE_MAX_WHEELS, history_cap=COMPARE_HISTORY_CAP):
+        self.max_wheels = max_wheels
+        self.history_cap = history_cap
+        self.params = []
+        self.generation = 0
+        self.running = False
+        for p in params[:max_wheels]:
+            if p not in self.params:
+                self.params.append(p)
+        self._rebuild()
+
+    def __len__(self):
+        return len(self.params)
+
+    @property
+    def full(self):
+        return len(self.params) >= self.max_wheels
+
+    def add(self, params):
+        # Adding a wheel restarts all of them, so they stay in step.
+        if self.full or params in self.params:
+            return False
+        self.params.append(params)
+        self._rebuild()
+        return True
+
+    def _rebuild(self):
+        columns = [np.array(values, dtype=np.float64) for values in zip(*((p.m, p.R_m, p.J, p.h0, p.g, p.tau) for p in self.params))]
+        if not columns:
+            columns = [np.empty(0)] * 6
+        self.batch = BatchMaxwellSimulation(*columns)
+        self.batch.running = True
+        self.colors = wheel_colors(len(self.params))
+        self.history = BatchHistory(len(self.params), max_samples=self.history_cap)
+        self.t = 0.0
+        self.running = False
+        self.generation += 1
+
+    def reset_state(self, clear_history=True):
+        self._rebuild()
+
+    def step(self, dt):
+        if not self.running or not self.params:
+            return
+        batch = self.batch
+        batch.step(dt)
+        self.t += dt
+        ep, ek_t, ek_r = batch.energies()
+        self.history.append(self.t, batch.h, batch.v, ep, ek_t, ek_r)
+
+    def snapshot(self):
+        batch = self.batch
+        return ComparisonSnapshot(
+            tuple(self.params),
+            self.colors,
+            self.generation,
+            self.t,
+            batch.h,
+            batch.v,
+            batch.omega,
+            batch.time_to_bottom.copy(),
+            batch.h0,
+            self.running,
+            self.history.snapshot(),
+        )
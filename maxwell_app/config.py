@@ -26,3 +26,27 @@ PENDULUM_START_Y = 150
 PIXELS_PER_METER = 400
 
 SIM_DT = 0.01
+
+HISTORY_CHUNK_SIZE = 4096
+HISTORY_STAGE_SIZE = 256
+HISTORY_RECENT_SAMPLES = 65536
+HISTORY_TIERS = 5
+HISTORY_TIER_FACTOR = 16
+HISTORY_TIER_SIZE = 4096
+TIMELINE_SPAN = 30.0
+TEXT_CACHE_SIZE = 256
+SIM_MAX_STEPS_PER_TICK = 100
+SIM_SPEED_MIN = 0.1
+SIM_SPEED_MAX = 100.0
+FRICTION_REST_DISTANCE = 1e-6
+RECORD_CHUNK_SIZE = 65536
+PROFILE_WINDOW = 600
+TRAJECTORY_CACHE_SIZE = 32
+TRAJECTORY_CACHE_SAMPLES = 1_000_000
+HIT_CELL_SIZE = 64
+COMPARE_MAX_WHEELS = 48
+COMPARE_HISTORY_CAP = 20000
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_MAX_BODY = 64 * 1024 * 1024
+SERVER_BATCH_MAX = 1_000_000
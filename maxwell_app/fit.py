@@ -0,0 +1,234 @@
+import argparse
+import csv
+import math
+import sys
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+
+# Every field is an array with one entry per group. Friction fields are NaN
+# when friction was not fitted; intervals are NaN when there are not enough
+# measurements for the residual scatter.
+InertiaFit = namedtuple(
+    "InertiaFit",
+    ["groups", "n", "J", "J_err", "J_low", "J_high", "tau", "tau_err", "tau_low", "tau_high", "T_rms"],
+)
+RadiusFit = namedtuple(
+    "RadiusFit",
+    ["groups", "n", "R", "R_err", "R_low", "R_high", "tau", "tau_err", "tau_low", "tau_high", "T_rms", "converged"],
+)
+
+
+def student_t_quantile(p, dof):
+    # No SciPy here: exact forms for 1 and 2 degrees of freedom, a
+    # Cornish-Fisher expansion around the normal quantile otherwise
+    # (about 1e-3 relative at 3 degrees of freedom, better above).
+    if dof == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if dof == 2:
+        return (2.0 * p - 1.0) / math.sqrt(2.0 * p * (1.0 - p))
+    z = NormalDist().inv_cdf(p)
+    v = float(dof)
+    return (
+        z
+        + (z**3 + z) / (4.0 * v)
+        + (5.0 * z**5 + 16.0 * z**3 + 3.0 * z) / (96.0 * v**2)
+        + (3.0 * z**7 + 19.0 * z**5 + 17.0 * z**3 - 15.0 * z) / (384.0 * v**3)
+        + (79.0 * z**9 + 776.0 * z**7 + 1482.0 * z**5 - 1920.0 * z**3 - 945.0 * z) / (92160.0 * v**4)
+    )
+
+
+def _t_factors(confidence, dof):
+    p = 0.5 + 0.5 * confidence
+    return np.array([student_t_quantile(p, int(d)) if d > 0 else np.nan for d in dof])
+
+
+def _group_index(groups, n):
+    if groups is None:
+        return np.array([0]), np.zeros(n, dtype=np.intp)
+    return np.unique(np.asarray(groups), return_inverse=True)
+
+
+def descent_time(m, R_m, J, h0, g=9.81, tau=0.0):
+    # Same physics as AnalyticMaxwellWheel.time_to_bottom, for arrays; NaN
+    # where the wheel does not descend.
+    m, R_m, J, h0, g, tau = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (m, R_m, J, h0, g, tau)))
+    R = np.maximum(R_m, 1e-6)
+    a = (m * g * R * R - tau * R) / (J + m * R * R)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where((a > 0) & (h0 > 0), np.sqrt(2.0 * h0 / a), np.nan)
+
+
+def fit_inertia(m, R_m, h0, T, groups=None, friction=False, g=9.81, confidence=0.95):
+    # From 2 h0 / T^2 = (m g R^2 - tau R) / (J + m R^2):
+    #     y = m R^2 (g T^2 / (2 h0) - 1) = J + tau * R T^2 / (2 h0)
+    # is linear in J and tau, so every group is solved in closed form. Rows
+    # are weighted by 1 / (dy/dT)^2, which makes this the least-squares fit
+    # of the measured times to first order.
+    m, R_m, h0, T = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (m, R_m, h0, T)))
+    R = np.maximum(R_m, 1e-6)
+    k = T * T / (2.0 * h0)
+    y = m * R * R * (g * k - 1.0)
+    x = R * k
+    w = 1.0 / (m * R * R * g * T / h0) ** 2
+
+    labels, idx = _group_index(groups, len(y))
+    size = len(labels)
+
+    def total(values):
+        return np.bincount(idx, weights=values, minlength=size)
+
+    n = np.bincount(idx, minlength=size)
+    sw, swy = total(w), total(w * y)
+    if friction:
+        swx, swxx, swxy = total(w * x), total(w * x * x), total(w * x * y)
+        det = sw * swxx - swx * swx
+        with np.errstate(divide="ignore", invalid="ignore"):
+            J = (swxx * swy - swx * swxy) / det
+            tau = (sw * swxy - swx * swy) / det
+            var_J, var_tau = swxx / det, sw / det
+        params = 2
+    else:
+        J = swy / sw
+        tau = np.full(size, np.nan)
+        var_J, var_tau = 1.0 / sw, np.full(size, np.nan)
+        params = 1
+
+    fitted = J[idx] + (np.nan_to_num(tau[idx]) * x if friction else 0.0)
+    dof = n - params
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(dof > 0, total(w * (y - fitted) ** 2) / dof, np.nan)
+    J_err = np.sqrt(var_J * scale)
+    tau_err = np.sqrt(var_tau * scale)
+    t = _t_factors(confidence, dof)
+
+    T_fit = descent_time(m, R_m, J[idx], h0, g, np.nan_to_num(tau[idx]))
+    T_rms = np.sqrt(total((T - T_fit) ** 2) / n)
+    return InertiaFit(labels, n, J, J_err, J - t * J_err, J + t * J_err, tau, tau_err, tau - t * tau_err, tau + t * tau_err, T_rms)
+
+
+def fit_axle_radius(m, J, h0, T, groups=None, friction=False, g=9.81, confidence=0.95, iterations=50, tol=1e-12):
+    # Descent times only depend on J / R^2 (and tau / R), so J and R cannot
+    # both be fitted from them. With J known, R (and tau) are found by
+    # Gauss-Newton on the times, all groups at once.
+    m, J, h0, T = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (m, J, h0, T)))
+    labels, idx = _group_index(groups, len(T))
+    size = len(labels)
+
+    def total(values):
+        return np.bincount(idx, weights=values, minlength=size)
+
+    n = np.bincount(idx, minlength=size)
+    k = T * T / (2.0 * h0)
+    # Start from the frictionless radius of every row, averaged per group.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        start = np.sqrt(J / (m * (g * k - 1.0)))
+    ok = np.isfinite(start)
+    R = total(np.where(ok, start, 0.0)) / np.maximum(np.bincount(idx, weights=ok, minlength=size), 1)
+    tau = np.zeros(size)
+    converged = np.zeros(size, dtype=bool)
+
+    for _ in range(iterations):
+        Ri, taui = R[idx], tau[idx]
+        D = J + m * Ri * Ri
+        N = m * g * Ri * Ri - taui * Ri
+        with np.errstate(divide="ignore", invalid="ignore"):
+            T_fit = np.sqrt(2.0 * h0 * D / N)
+            r = T - T_fit
+            dR = 0.5 * T_fit * (2.0 * m * Ri / D - (2.0 * m * g * Ri - taui) / N)
+            if friction:
+                dtau = 0.5 * T_fit * Ri / N
+                a, b, c = total(dR * dR), total(dR * dtau), total(dtau * dtau)
+                u, v = total(dR * r), total(dtau * r)
+                det = a * c - b * b
+                step_R = (c * u - b * v) / det
+                step_tau = (a * v - b * u) / det
+            else:
+                step_R = total(dR * r) / total(dR * dR)
+                step_tau = np.zeros(size)
+        step_R = np.where(converged | ~np.isfinite(step_R), 0.0, step_R)
+        step_tau = np.where(converged | ~np.isfinite(step_tau), 0.0, step_tau)
+        # Halve steps that would make the radius non-positive.
+        step_R = np.where(R + step_R <= 0, -0.5 * R, step_R)
+        R = R + step_R
+        tau = tau + step_tau
+        converged |= np.abs(step_R) <= tol * np.abs(R)
+        if converged.all():
+            break
+
+    Ri, taui = R[idx], tau[idx]
+    D = J + m * Ri * Ri
+    N = m * g * Ri * Ri - taui * Ri
+    params = 2 if friction else 1
+    dof = n - params
+    with np.errstate(divide="ignore", invalid="ignore"):
+        T_fit = np.sqrt(2.0 * h0 * D / N)
+        r = T - T_fit
+        dR = 0.5 * T_fit * (2.0 * m * Ri / D - (2.0 * m * g * Ri - taui) / N)
+        scale = np.where(dof > 0, total(r * r) / dof, np.nan)
+        if friction:
+            dtau = 0.5 * T_fit * Ri / N
+            a, b, c = total(dR * dR), total(dR * dtau), total(dtau * dtau)
+            det = a * c - b * b
+            R_err, tau_err = np.sqrt(c / det * scale), np.sqrt(a / det * scale)
+        else:
+            R_err, tau_err = np.sqrt(scale / total(dR * dR)), np.full(size, np.nan)
+            tau = np.full(size, np.nan)
+    t = _t_factors(confidence, dof)
+    T_rms = np.sqrt(total(r * r) / n)
+    return RadiusFit(labels, n, R, R_err, R - t * R_err, R + t * R_err, tau, tau_err, tau - t * tau_err, tau + t * tau_err, T_rms, converged)
+
+
+def read_measurements(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"{path}: нет измерений")
+    columns = {name: [row[name] for row in rows] for name in rows[0]}
+    return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m maxwell_app.fit",
+        description="Обратная задача: момент инерции J (или радиус оси R при известном J) по измеренным временам спуска. "
+        "CSV со столбцами m (кг), R (мм) или J (кг·м²), h0 (м), T (с) и, если нужно, group.",
+    )
+    parser.add_argument("data", help="CSV с измерениями")
+    parser.add_argument("--solve", choices=("J", "R"), default="J", help="что искать: J по R или R по известному J")
+    parser.add_argument("--friction", action="store_true", help="также искать момент трения τтр")
+    parser.add_argument("--group-column", default="group", help="столбец с номером группы/колеса")
+    parser.add_argument("--g", type=float, default=9.81, help="ускорение g, м/с²")
+    parser.add_argument("--confidence", type=float, default=0.95, help="уровень доверия интервалов")
+    args = parser.parse_args(argv)
+
+    try:
+        columns = read_measurements(args.data)
+        m = np.array(columns["m"], dtype=float)
+        h0 = np.array(columns["h0"], dtype=float)
+        T = np.array(columns["T"], dtype=float)
+        groups = columns.get(args.group_column)
+        if args.solve == "J":
+            result = fit_inertia(m, np.array(columns["R"], dtype=float) / 1000.0, h0, T, groups, args.friction, args.g, args.confidence)
+            value, scale, unit = "J", 1.0, "кг·м²"
+        else:
+            result = fit_axle_radius(m, np.array(columns["J"], dtype=float), h0, T, groups, args.friction, args.g, args.confidence)
+            value, scale, unit = "R", 1000.0, "мм"
+    except (OSError, KeyError, ValueError) as e:
+        parser.error(f"не удалось прочитать измерения: {e}")
+
+    level = f"{args.confidence:.0%}"
+    print(f"{'группа':>8} {'n':>4} {value + ', ' + unit:>14} {'± (' + level + ')':>12} {'τтр, Н·м':>12} {'± (' + level + ')':>12} {'ΔT rms, с':>10}")
+    fitted = getattr(result, value) * scale
+    low = getattr(result, value + "_low") * scale
+    for i, label in enumerate(result.groups):
+        half = fitted[i] - low[i]
+        tau_half = result.tau[i] - result.tau_low[i]
+        print(f"{str(label):>8} {result.n[i]:>4} {fitted[i]:>14.6g} {half:>12.3g} {result.tau[i]:>12.4g} {tau_half:>12.3g} {result.T_rms[i]:>10.4g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import json
+import os
+
+import pygame
+
+
+_paths = None
+
+
+def cache_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "maxwell_app", "fonts.json")
+
+
+def _cached_paths():
+    global _paths
+    if _paths is None:
+        try:
+            with open(cache_path(), encoding="utf-8") as f:
+                _paths = json.load(f)
+        except (OSError, ValueError):
+            _paths = {}
+        if not isinstance(_paths, dict):
+            _paths = {}
+    return _paths
+
+
+def _save_paths(paths):
+    path = cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(paths, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def resolve_font(name):
+    # Finding a system font makes pygame scan every installed font, which is
+    # the slowest part of a cold start. The resolved file is remembered on
+    # disk; None means "not installed, use the default font". Delete the
+    # cache file to force a new scan.
+    paths = _cached_paths()
+    key = name.lower().replace(" ", "")
+    if key in paths:
+        path = paths[key]
+        if path is None or os.path.exists(path):
+            return path
+
+    path = pygame.font.match_font(name)
+    paths[key] = path
+    _save_paths(paths)
+    return path
+
+
+def load_font(name, size):
+    return pygame.font.Font(resolve_font(name), size)
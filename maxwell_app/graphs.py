@@ -1,38 +1,203 @@
+import math
+
+import numpy as np
 import pygame
 
 
-def draw_series_graph(surface, rect, times, series_list, colors):
-    pygame.draw.rect(surface, (40, 40, 40), rect)
-    pygame.draw.rect(surface, (100, 100, 100), rect, 1)
+GRAPH_BG_COLOR = (40, 40, 40)
+GRAPH_BORDER_COLOR = (100, 100, 100)
+
+
+def pixel_columns(times, t_min, t_max, columns):
+    edges = t_min + (t_max - t_min) * (np.arange(columns) / columns)
+    starts = np.searchsorted(times, edges, side="left")
+    starts[0] = 0
+    keep = starts < np.append(starts[1:], len(times))
+    return np.flatnonzero(keep), starts[keep]
+
+
+def decimate_minmax(series, starts):
+    # M4 reduction: first, min, max and last sample of every pixel column keep
+    # the drawn polyline identical to the full-resolution one. series may be
+    # 2-D, one series per row.
+    ends = np.append(starts[1:], series.shape[-1]) - 1
+    lo = np.minimum.reduceat(series, starts, axis=-1)
+    hi = np.maximum.reduceat(series, starts, axis=-1)
+    ys = np.stack((series[..., starts], lo, hi, series[..., ends]), axis=-1)
+    return ys.reshape(series.shape[:-1] + (-1,)), lo, hi
+
+
+def reduce_series(times, series_list, t_min, t_max, columns):
+    shared = pixel_columns(times, t_min, t_max, columns)
+    series_list = [np.asarray(series, dtype=float) for series in series_list]
+    if len(series_list) > 1 and len(times) >= 2 and all(len(series) >= len(times) for series in series_list):
+        # Many series on one time axis (the comparison) are reduced in a
+        # single pass over a stacked array.
+        cols, starts = shared
+        cols = np.repeat(cols, 4)
+        stacked = np.stack([series[: len(times)] for series in series_list])
+        ys, lo, hi = decimate_minmax(stacked, starts)
+        return [(cols, row, float(row_lo.min()), float(row_hi.max())) for row, row_lo, row_hi in zip(ys, lo, hi)]
+
+    reduced = []
+    for series in series_list:
+        n = min(len(times), len(series))
+        if n < 2:
+            reduced.append(None)
+            continue
+        cols, starts = shared if n == len(times) else pixel_columns(times[:n], t_min, t_max, columns)
+        ys, lo, hi = decimate_minmax(series[:n], starts)
+        reduced.append((np.repeat(cols, 4), ys, float(lo.min()), float(hi.max())))
+    return reduced
+
+
+def draw_reduced(surface, rect, reduced, colors, v_min, v_max):
+    y_scale = rect.height / (v_max - v_min)
+    for item, color in zip(reduced, colors):
+        if item is None:
+            continue
+        cols, ys = item[0], item[1]
+        xs = rect.left + cols
+        ys = rect.bottom - (ys - v_min) * y_scale
+        points = np.column_stack((xs, ys)).tolist()
+        pygame.draw.lines(surface, color, False, points, 1)
+
+
+def ghost_color(color):
+    return tuple((c + g) // 2 for c, g in zip(color, GRAPH_BG_COLOR))
 
-    if not times or len(times) < 2:
+
+def draw_layers(surface, rect, layers):
+    # layers is a list of (times, series_list, colors), drawn in order on one
+    # shared time and value scale.
+    pygame.draw.rect(surface, GRAPH_BG_COLOR, rect)
+    pygame.draw.rect(surface, GRAPH_BORDER_COLOR, rect, 1)
+
+    layers = [(np.asarray(times, dtype=float), series_list, colors) for times, series_list, colors in layers]
+    layers = [layer for layer in layers if len(layer[0]) >= 2]
+    if not layers or rect.width <= 0:
         return
 
-    t_min = times[0]
-    t_max = times[-1]
+    t_min = min(times[0] for times, _, _ in layers)
+    t_max = max(times[-1] for times, _, _ in layers)
     if t_max <= t_min:
         t_max = t_min + 1e-6
 
-    values = []
-    for series in series_list:
-        values.extend(series)
-    if not values:
+    reduced = [reduce_series(times, series_list, t_min, t_max, rect.width) for times, series_list, _ in layers]
+    present = [item for items in reduced for item in items if item is not None]
+    if not present:
         return
 
-    v_min = min(values)
-    v_max = max(values)
+    v_min = min(item[2] for item in present)
+    v_max = max(item[3] for item in present)
     if v_max <= v_min:
         v_max = v_min + 1e-6
 
-    def to_screen(t, v):
-        x = rect.left + (t - t_min) / (t_max - t_min) * rect.width
-        y = rect.bottom - (v - v_min) / (v_max - v_min) * rect.height
-        return x, y
-
-    for series, color in zip(series_list, colors):
-        points = []
-        for t, v in zip(times, series):
-            sx, sy = to_screen(t, v)
-            points.append((sx, sy))
-        if len(points) >= 2:
-            pygame.draw.lines(surface, color, False, points, 1)
+    # Extremes map onto the bottom and right edges, one pixel outside rect.
+    clip = surface.get_clip()
+    surface.set_clip(rect)
+    for items, (_, _, colors) in zip(reduced, layers):
+        draw_reduced(surface, rect, items, colors, v_min, v_max)
+    surface.set_clip(clip)
+
+
+def draw_series_graph(surface, rect, times, series_list, colors):
+    draw_layers(surface, rect, [(times, series_list, colors)])
+
+
+class SeriesGraph:
+    def __init__(self, rect, colors):
+        self.rect = pygame.Rect(rect)
+        self.colors = list(colors)
+        self.surface = pygame.Surface(self.rect.size)
+        self.full_redraws = 0
+        self.reset()
+
+    def reset(self):
+        self.surface.fill(GRAPH_BG_COLOR)
+        self._generation = None
+        self._count = 0
+        self._t_min = None
+        self._t_span = None
+        self._v_min = None
+        self._v_max = None
+        self._lo = None
+        self._hi = None
+
+    def _fit_bounds(self, times, series_list, start):
+        lo = min(float(series[start:].min()) for series in series_list)
+        hi = max(float(series[start:].max()) for series in series_list)
+        changed = False
+
+        t_min = float(times[0])
+        span = float(times[-1]) - t_min
+        if self._t_span is None or t_min != self._t_min or span > self._t_span:
+            self._t_min = t_min
+            self._t_span = 2.0 ** math.ceil(math.log2(max(span, 1e-6)))
+            changed = True
+
+        self._lo = lo if self._lo is None else min(self._lo, lo)
+        self._hi = hi if self._hi is None else max(self._hi, hi)
+        if self._v_min is not None and self._v_min <= self._lo and self._hi <= self._v_max:
+            return changed
+
+        # Snap the value range to a power-of-two width on a 1/8 grid, so a
+        # slowly drifting extreme costs O(log range) full redraws instead of
+        # one per frame while keeping the curve at least ~half the height.
+        width = 2.0 ** math.ceil(math.log2(max(self._hi - self._lo, 1e-9)))
+        while True:
+            step = width / 8.0
+            v_min = math.floor(self._lo / step) * step
+            if self._hi <= v_min + width:
+                break
+            width *= 2.0
+        self._v_min = v_min
+        self._v_max = v_min + width
+        return True
+
+    def _column(self, t):
+        return int((t - self._t_min) * (self.rect.width / self._t_span))
+
+    def _to_local(self, times, series):
+        w, h = self.rect.size
+        xs = (times - self._t_min) * (w / self._t_span)
+        ys = h - (series - self._v_min) * (h / (self._v_max - self._v_min))
+        return np.column_stack((xs, ys)).tolist()
+
+    def update(self, times, series_list, generation=None):
+        times = np.asarray(times, dtype=float)
+        series_list = [np.asarray(series, dtype=float) for series in series_list]
+        n = min([len(times)] + [len(series) for series in series_list])
+
+        if generation != self._generation or n < self._count:
+            self.reset()
+            self._generation = generation
+        if n < 2 or n == self._count:
+            return
+
+        times = times[:n]
+        series_list = [series[:n] for series in series_list]
+        start = max(self._count - 1, 0)
+
+        if self._fit_bounds(times, series_list, start) or self._count == 0:
+            self.full_redraws += 1
+            self.surface.fill(GRAPH_BG_COLOR)
+            local = pygame.Rect((0, 0), self.rect.size)
+            reduced = reduce_series(times, series_list, self._t_min, self._t_min + self._t_span, local.width)
+            draw_reduced(self.surface, local, reduced, self.colors, self._v_min, self._v_max)
+        elif n - start > 4 * (self._column(times[-1]) - self._column(times[start]) + 1):
+            # More new samples than the M4 reduction keeps: reduce the tail
+            # (it starts at the last drawn sample, so the curve stays joined).
+            local = pygame.Rect((0, 0), self.rect.size)
+            tail = [series[start:] for series in series_list]
+            reduced = reduce_series(times[start:], tail, self._t_min, self._t_min + self._t_span, local.width)
+            draw_reduced(self.surface, local, reduced, self.colors, self._v_min, self._v_max)
+        else:
+            for series, color in zip(series_list, self.colors):
+                pygame.draw.lines(self.surface, color, False, self._to_local(times[start:], series[start:]), 1)
+
+        self._count = n
+
+    def draw(self, surface):
+        surface.blit(self.surface, self.rect)
+        pygame.draw.rect(surface, GRAPH_BORDER_COLOR, self.rect, 1)
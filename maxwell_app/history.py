@@ -0,0 +1,355 @@
+import threading
+
+import numpy as np
+
+from .config import HISTORY_CHUNK_SIZE, HISTORY_STAGE_SIZE, HISTORY_TIER_FACTOR, HISTORY_TIER_SIZE
+
+
+FIELDS = ("t", "h", "v", "ep", "ek_t", "ek_r")
+
+
+class HistorySnapshot:
+    __slots__ = ("generation", "seq", "coarse", "tiers", "_data")
+
+    def __init__(self, data, generation, seq, coarse=0, tiers=()):
+        # Samples inside the live window are never written again: appends go
+        # past the end, eviction only moves the start, and growing, folding
+        # or clearing switches to a fresh buffer. A read-only view of the
+        # window is therefore a stable snapshot. The first `coarse` samples
+        # are the folded tiers, two per bucket (see History).
+        data = data.view()
+        data.flags.writeable = False
+        self._data = data
+        self.generation = generation
+        self.seq = seq
+        self.coarse = coarse
+        self.tiers = tiers
+
+    def __len__(self):
+        return self._data.shape[-1]
+
+    def __getitem__(self, name):
+        try:
+            return self._data[FIELDS.index(name)]
+        except ValueError:
+            raise KeyError(name) from None
+
+    def __contains__(self, name):
+        return name in FIELDS
+
+    def keys(self):
+        return FIELDS
+
+    def items(self):
+        return zip(FIELDS, self._data)
+
+    def columns(self):
+        return dict(self.items())
+
+    def copy(self):
+        # A snapshot that owns exactly its samples; a view keeps the whole,
+        # partly empty buffer of the history alive.
+        tiers = tuple(tier.copy() for tier in self.tiers)
+        return HistorySnapshot(self._data.copy(), self.generation, self.seq, self.coarse, tiers)
+
+
+def _reduce(buckets, factor):
+    # buckets is (3, fields, ..., count): the min, max and mean of every
+    # bucket. Groups of `factor` consecutive buckets become one.
+    grouped = buckets.reshape(buckets.shape[:-1] + (-1, factor))
+    return np.stack((grouped[0].min(axis=-1), grouped[1].max(axis=-1), grouped[2].mean(axis=-1)))
+
+
+def _pairs(tier):
+    # Every bucket is shown as its minimum at its first time and its maximum
+    # at its last one; a graph reduced to pixel columns then draws the same
+    # envelope as the full-resolution samples did.
+    return np.stack((tier[0], tier[1]), axis=-1).reshape(tier.shape[1:-1] + (-1,))
+
+
+class History:
+    FIELDS = FIELDS
+
+    # With max_samples set, samples older than the last max_samples are
+    # dropped, or with tiers folded into up to `tiers` coarser levels: level
+    # k keeps the min, max and mean of every tier_factor**k samples, at most
+    # tier_size buckets per level, and the coarsest level drops its oldest
+    # buckets. Memory stays bounded while the live window still spans the
+    # whole run, coarse levels first.
+    #
+    # append() takes no lock: samples are staged in a flat list and moved
+    # into the buffer stage_size at a time, or earlier when anything reads
+    # the history. list.extend and deleting a slice are atomic, so a reader
+    # may flush while the simulation thread keeps appending.
+    def __init__(
+        self,
+        chunk_size=HISTORY_CHUNK_SIZE,
+        max_samples=None,
+        tiers=0,
+        tier_factor=HISTORY_TIER_FACTOR,
+        tier_size=HISTORY_TIER_SIZE,
+        stage_size=HISTORY_STAGE_SIZE,
+    ):
+        self.chunk_size = max(1, int(chunk_size))
+        self.stage_size = max(1, int(stage_size))
+        self._stage_limit = self.stage_size * len(self.FIELDS)
+        self._stage = []
+        self.max_samples = max_samples
+        self.tiers = tiers
+        self.tier_factor = max(1, int(tier_factor))
+        # Folds move whole chunks of tier_factor buckets between levels.
+        self.tier_size = -(-max(1, int(tier_size)) // self.tier_factor) * self.tier_factor
+        self._buf = self._empty(self.chunk_size)
+        self._start = 0
+        self._n = 0
+        self._coarse = 0
+        self._tiers = ()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.seq = 0
+        self.dropped = 0
+        self.folded = 0
+
+    def __len__(self):
+        self.flush()
+        return self._n - self._start
+
+    @property
+    def capacity(self):
+        return self._buf.shape[-1]
+
+    def _empty(self, capacity):
+        return np.empty((len(self.FIELDS), capacity), dtype=np.float64)
+
+    def _grow(self, needed):
+        # needed is the number of live samples that must fit; only the live
+        # window is copied, which also compacts away evicted samples.
+        cap = self.capacity
+        while cap < needed:
+            cap += max(self.chunk_size, cap)
+        cap = -(-cap // self.chunk_size) * self.chunk_size
+        size = self._n - self._start
+        buf = self._empty(cap)
+        buf[..., :size] = self._buf[..., self._start : self._n]
+        self._buf = buf
+        self._start = 0
+        self._n = size
+
+    def _evict(self):
+        # Older samples are dropped a whole chunk at a time, so consumers
+        # that redraw when the first sample changes do so once per chunk
+        # instead of on every step.
+        if self.max_samples is None:
+            return
+        excess = self._n - self._start - self._coarse - self.max_samples
+        if excess < self.chunk_size:
+            return
+        # A fold rebuilds the window, so it waits for a quarter of the
+        # recent samples to be due.
+        block = max(self.chunk_size, self.max_samples // 4) if self.tiers else self.chunk_size
+        if excess < block:
+            return
+        drop = excess // block * block
+        if self.tiers:
+            self._fold(drop - drop % self.tier_factor)
+        else:
+            self._start += drop
+            self.dropped += drop
+
+    def _fold(self, count):
+        # Moves the oldest count full-resolution samples into the first
+        # level, cascading whatever a level cannot hold into the next one.
+        # The window is rebuilt in a fresh buffer, as _grow does, so
+        # snapshots stay valid; generation changes because earlier samples
+        # are replaced.
+        if count <= 0:
+            return
+        first = self._start + self._coarse
+        samples = self._buf[..., first : first + count]
+        buckets = _reduce(np.stack((samples, samples, samples)), self.tier_factor)
+        tiers = list(self._tiers)
+        for level in range(self.tiers):
+            if level == len(tiers):
+                tiers.append(buckets)
+                buckets = None
+                break
+            tier = np.concatenate((tiers[level], buckets), axis=-1)
+            excess = tier.shape[-1] - self.tier_size
+            if excess <= 0:
+                tiers[level] = tier
+                buckets = None
+                break
+            move = -(-excess // self.tier_factor) * self.tier_factor
+            tiers[level] = tier[..., move:]
+            buckets = tier[..., :move]
+            if level + 1 < self.tiers:
+                buckets = _reduce(buckets, self.tier_factor)
+        if buckets is not None:
+            self.dropped += buckets.shape[-1] * self.tier_factor ** self.tiers
+        self.folded += count
+
+        coarse = [_pairs(tier) for tier in reversed(tiers)]
+        recent = self._buf[..., first + count : self._n]
+        size = sum(pairs.shape[-1] for pairs in coarse)
+        self._buf = self._empty(-(-(size + recent.shape[-1] + 1) // self.chunk_size) * self.chunk_size)
+        self._buf[..., :size] = np.concatenate(coarse, axis=-1)
+        self._buf[..., size : size + recent.shape[-1]] = recent
+        self._start = 0
+        self._n = size + recent.shape[-1]
+        self._coarse = size
+        self._tiers = tuple(tiers)
+        self.generation += 1
+
+    def _reserve(self, count):
+        if self._n + count > self.capacity:
+            self._grow(self._n - self._start + count)
+
+    def append(self, t, h, v, ep, ek_t, ek_r):
+        stage = self._stage
+        stage.extend((t, h, v, ep, ek_t, ek_r))
+        if len(stage) >= self._stage_limit:
+            self.flush()
+
+    def flush(self):
+        if self._stage:
+            with self._lock:
+                self._flush()
+
+    def _flush(self):
+        # Only the samples staged when the flush starts are taken; appends
+        # that arrive meanwhile wait for the next one.
+        stage = self._stage
+        size = len(stage)
+        if not size:
+            return
+        width = len(self.FIELDS)
+        count = size // width
+        block = np.fromiter(stage[:size], np.float64, size).reshape(count, width)
+        del stage[:size]
+        self._reserve(count)
+        n = self._n
+        self._buf[:, n : n + count] = block.T
+        self._n = n + count
+        self.seq += count
+        self._evict()
+
+    def extend(self, t, h, v, ep, ek_t, ek_r):
+        rows = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64).ravel() for x in (t, h, v, ep, ek_t, ek_r)))
+        count = rows[0].shape[0]
+        with self._lock:
+            self._flush()
+            self._reserve(count)
+            n = self._n
+            self._buf[:, n : n + count] = rows
+            self._n = n + count
+            self.seq += count
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._stage.clear()
+            self._buf = self._empty(self.chunk_size)
+            self._start = 0
+            self._n = 0
+            self._coarse = 0
+            self._tiers = ()
+            self.generation += 1
+            self.seq += 1
+            self.dropped = 0
+            self.folded = 0
+
+    def load(self, snapshot):
+        # Replaces the contents with a copy of a snapshot, folded levels
+        # included.
+        with self._lock:
+            self._stage.clear()
+            size = len(snapshot)
+            self._buf = self._empty(-(-(size + 1) // self.chunk_size) * self.chunk_size)
+            self._buf[..., :size] = snapshot._data
+            self._start = 0
+            self._n = size
+            self._coarse = snapshot.coarse
+            self._tiers = snapshot.tiers
+            self.generation += 1
+            self.seq += 1
+            self.dropped = 0
+            self.folded = 0
+
+    def snapshot(self):
+        with self._lock:
+            self._flush()
+            return HistorySnapshot(self._buf[..., self._start : self._n], self.generation, self.seq, self._coarse, self._tiers)
+
+    def column(self, name):
+        self.flush()
+        return self._buf[self.FIELDS.index(name), ..., self._start : self._n]
+
+    def columns(self):
+        self.flush()
+        buf = self._buf[..., self._start : self._n]
+        return {name: buf[i] for i, name in enumerate(self.FIELDS)}
+
+    @property
+    def t(self):
+        self.flush()
+        return self._buf[0, ..., self._start : self._n]
+
+    @property
+    def h(self):
+        self.flush()
+        return self._buf[1, ..., self._start : self._n]
+
+    @property
+    def v(self):
+        self.flush()
+        return self._buf[2, ..., self._start : self._n]
+
+    @property
+    def ep(self):
+        self.flush()
+        return self._buf[3, ..., self._start : self._n]
+
+    @property
+    def ek_t(self):
+        self.flush()
+        return self._buf[4, ..., self._start : self._n]
+
+    @property
+    def ek_r(self):
+        self.flush()
+        return self._buf[5, ..., self._start : self._n]
+
+
+class BatchHistory(History):
+    # History of several wheels stepped together: every field is a
+    # (wheels, samples) array. Time is shared, but stored per wheel too so
+    # all fields have the same shape.
+    def __init__(self, width, chunk_size=HISTORY_CHUNK_SIZE, max_samples=None):
+        self.width = width
+        super().__init__(chunk_size, max_samples)
+
+    def _empty(self, capacity):
+        return np.empty((len(self.FIELDS), self.width, capacity), dtype=np.float64)
+
+    def append(self, t, h, v, ep, ek_t, ek_r):
+        with self._lock:
+            self._reserve(1)
+            n = self._n
+            self._buf[0, :, n] = t
+            self._buf[1:, :, n] = (h, v, ep, ek_t, ek_r)
+            self._n = n + 1
+            self.seq += 1
+            self._evict()
+
+    def extend(self, t, h, v, ep, ek_t, ek_r):
+        # t is (samples,), every other field (wheels, samples).
+        t = np.asarray(t, dtype=np.float64).ravel()
+        count = t.shape[0]
+        with self._lock:
+            self._reserve(count)
+            n = self._n
+            self._buf[0, :, n : n + count] = t
+            self._buf[1:, :, n : n + count] = (h, v, ep, ek_t, ek_r)
+            self._n = n + count
+            self.seq += count
+            self._evict()
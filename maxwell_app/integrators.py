@@ -0,0 +1,76 @@
+class Integrator:
+    name = ""
+    label = ""
+    # True when advance() evaluates the acceleration only at the start of
+    # the step, so advance_constant() is always equivalent to it.
+    single_stage = False
+
+    def advance(self, h, v, accel, dt):
+        raise NotImplementedError
+
+    def advance_constant(self, h, v, a, dt):
+        # The same step for an acceleration that does not change within it,
+        # without calling back for every stage.
+        raise NotImplementedError
+
+
+class SemiImplicitEuler(Integrator):
+    name = "euler"
+    label = "Эйлер"
+    single_stage = True
+
+    def advance(self, h, v, accel, dt):
+        v = v + accel(h, v) * dt
+        h = h + v * dt
+        return h, v
+
+    def advance_constant(self, h, v, a, dt):
+        v = v + a * dt
+        return h + v * dt, v
+
+
+class VelocityVerlet(Integrator):
+    name = "verlet"
+    label = "Верле"
+
+    def advance(self, h, v, accel, dt):
+        a0 = accel(h, v)
+        h_new = h + v * dt + 0.5 * a0 * dt * dt
+        a1 = accel(h_new, v + a0 * dt)
+        return h_new, v + 0.5 * (a0 + a1) * dt
+
+    def advance_constant(self, h, v, a, dt):
+        return h + v * dt + 0.5 * a * dt * dt, v + 0.5 * (a + a) * dt
+
+
+class RungeKutta4(Integrator):
+    name = "rk4"
+    label = "РК4"
+
+    def advance(self, h, v, accel, dt):
+        half = 0.5 * dt
+        k1h, k1v = v, accel(h, v)
+        k2h, k2v = v + half * k1v, accel(h + half * k1h, v + half * k1v)
+        k3h, k3v = v + half * k2v, accel(h + half * k2h, v + half * k2v)
+        k4h, k4v = v + dt * k3v, accel(h + dt * k3h, v + dt * k3v)
+        h = h + dt / 6.0 * (k1h + 2.0 * k2h + 2.0 * k3h + k4h)
+        v = v + dt / 6.0 * (k1v + 2.0 * k2v + 2.0 * k3v + k4v)
+        return h, v
+
+    def advance_constant(self, h, v, a, dt):
+        half = 0.5 * dt
+        k2h = v + half * a
+        k4h = v + dt * a
+        h = h + dt / 6.0 * (v + 2.0 * k2h + 2.0 * k2h + k4h)
+        v = v + dt / 6.0 * (a + 2.0 * a + 2.0 * a + a)
+        return h, v
+
+
+INTEGRATORS = {cls.name: cls() for cls in (SemiImplicitEuler, VelocityVerlet, RungeKutta4)}
+
+
+def get_integrator(name):
+    try:
+        return INTEGRATORS[name]
+    except KeyError:
+        raise ValueError(f"unknown integrator {name!r}, expected one of {', '.join(INTEGRATORS)}") from None
@@ -0,0 +1,40 @@
+class WheelParams:
+    # Immutable, hashable set of physical parameters. tau is the friction
+    # torque actually applied (zero when friction is off), so two parameter
+    # sets that simulate the same motion compare equal. The quantities that
+    # every step needs are computed once here.
+    __slots__ = ("m", "R_m", "J", "h0", "g", "tau", "R", "denom", "a0", "a_friction", "_key", "_hash")
+
+    def __init__(self, m, R_m, J, h0, g, tau=0.0):
+        tau = max(0.0, tau)
+        R = max(R_m, 1e-6)
+        denom = J + m * R * R
+        if denom > 0:
+            a0 = (m * g * R * R) / denom
+            a_friction = tau * R / denom
+        else:
+            a0 = 0.0
+            a_friction = 0.0
+        key = (m, R_m, J, h0, g, tau)
+        for name, value in zip(self.__slots__, key + (R, denom, a0, a_friction, key, hash(key))):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, WheelParams):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in zip(self.__slots__, self._key))
+        return f"WheelParams({fields})"
+
+    def replace(self, **changes):
+        values = dict(zip(self.__slots__, self._key))
+        values.update(changes)
+        return WheelParams(**values)
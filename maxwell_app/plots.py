@@ -1,78 +1,211 @@
 import os
-import numpy as np
+import threading
+from collections import namedtuple
 
 
-def snapshot_history(sim):
-    return {
-        "t": np.array(sim.time_history, dtype=float),
-        "h": np.array(sim.h_history, dtype=float),
-        "v": np.array(sim.v_history, dtype=float),
-        "ep": np.array(sim.ep_history, dtype=float),
-        "ek_t": np.array(sim.ek_trans_history, dtype=float),
-        "ek_r": np.array(sim.ek_rot_history, dtype=float),
-    }
+PLOT_KINDS = ("height", "velocity", "energy")
+PLOT_COLUMNS = {
+    "height": ("t", "h"),
+    "velocity": ("t", "v"),
+    "energy": ("t", "ep", "ek_t", "ek_r"),
+}
 
+ExportStatus = namedtuple("ExportStatus", ["state", "done", "total", "folder", "error", "serial"])
 
-def save_plots(history, folder="plots"):
-    import matplotlib
 
-    matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
+def style_ax(ax):
+    ax.set_facecolor("#1a1a1a")
+    ax.figure.set_facecolor("#1a1a1a")
+    ax.tick_params(colors="#e0e0e0")
+    for spine in ax.spines.values():
+        spine.set_color("#e0e0e0")
+    ax.xaxis.label.set_color("#e0e0e0")
+    ax.yaxis.label.set_color("#e0e0e0")
+    ax.title.set_color("#e0e0e0")
 
-    if len(history["t"]) < 2:
-        return
 
-    os.makedirs(folder, exist_ok=True)
+def wheel_lines(ax, t, values, colors, **style):
+    # In a comparison every field has one row per wheel; each wheel is drawn
+    # in the color it has in the window.
+    for wheel, color in enumerate(colors):
+        ax.plot(t[wheel], values[wheel], color=tuple(c / 255.0 for c in color), **style)
+
+
+def save_plot(kind, history, folder="plots", colors=None):
+    # The object-oriented Figure API keeps no global pyplot state, so several
+    # figures can be rendered at once. colors, one per wheel, marks the
+    # history of a comparison.
+    from matplotlib.figure import Figure
+    from matplotlib.lines import Line2D
 
     t = history["t"]
-    h = history["h"]
-    v = history["v"]
-    ep = history["ep"]
-    ek_t = history["ek_t"]
-    ek_r = history["ek_r"]
-
-    def style_ax(ax):
-        ax.set_facecolor("#1a1a1a")
-        ax.figure.set_facecolor("#1a1a1a")
-        ax.tick_params(colors="#e0e0e0")
-        for spine in ax.spines.values():
-            spine.set_color("#e0e0e0")
-        ax.xaxis.label.set_color("#e0e0e0")
-        ax.yaxis.label.set_color("#e0e0e0")
-        ax.title.set_color("#e0e0e0")
-
-    fig, ax = plt.subplots(figsize=(6, 4))
-    ax.plot(t, h, color="#ff4444", label="h(t)")
-    ax.set_xlabel("t, s")
-    ax.set_ylabel("h, m")
-    ax.set_title("Высота h(t)")
-    style_ax(ax)
-    ax.grid(True, color="#444444")
-    fig.tight_layout()
-    fig.savefig(os.path.join(folder, "height.jpg"), dpi=150)
-    plt.close(fig)
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
 
-    fig, ax = plt.subplots(figsize=(6, 4))
-    ax.plot(t, v, color="#4488ff", label="v(t)")
-    ax.set_xlabel("t, s")
-    ax.set_ylabel("v, m/s")
-    ax.set_title("Скорость v(t)")
-    style_ax(ax)
-    ax.grid(True, color="#444444")
-    fig.tight_layout()
-    fig.savefig(os.path.join(folder, "velocity.jpg"), dpi=150)
-    plt.close(fig)
+    if kind == "height":
+        if colors is None:
+            ax.plot(t, history["h"], color="#ff4444", label="h(t)")
+        else:
+            wheel_lines(ax, t, history["h"], colors)
+        ax.set_ylabel("h, m")
+        ax.set_title("Высота h(t)")
+    elif kind == "velocity":
+        if colors is None:
+            ax.plot(t, history["v"], color="#4488ff", label="v(t)")
+        else:
+            wheel_lines(ax, t, history["v"], colors)
+        ax.set_ylabel("v, m/s")
+        ax.set_title("Скорость v(t)")
+    elif kind == "energy":
+        if colors is None:
+            ax.plot(t, history["ep"], color="#44ff44", label="Ep")
+            ax.plot(t, history["ek_t"], color="#ffff44", label="Ek поступ.")
+            ax.plot(t, history["ek_r"], color="#ff8844", label="Ek вращ.")
+            ax.legend()
+        else:
+            wheel_lines(ax, t, history["ep"], colors)
+            wheel_lines(ax, t, history["ek_t"] + history["ek_r"], colors, linestyle="--")
+            ax.legend(
+                [Line2D([], [], color="#e0e0e0"), Line2D([], [], color="#e0e0e0", linestyle="--")],
+                ["Ep", "Ek"],
+            )
+        ax.set_ylabel("E, Дж")
+        ax.set_title("Энергии во времени")
+    else:
+        raise ValueError(f"unknown plot {kind!r}, expected one of {', '.join(PLOT_KINDS)}")
 
-    fig, ax = plt.subplots(figsize=(6, 4))
-    ax.plot(t, ep, color="#44ff44", label="Ep")
-    ax.plot(t, ek_t, color="#ffff44", label="Ek поступ.")
-    ax.plot(t, ek_r, color="#ff8844", label="Ek вращ.")
     ax.set_xlabel("t, s")
-    ax.set_ylabel("E, Дж")
-    ax.set_title("Энергии во времени")
-    ax.legend()
     style_ax(ax)
     ax.grid(True, color="#444444")
     fig.tight_layout()
-    fig.savefig(os.path.join(folder, "energy.jpg"), dpi=150)
-    plt.close(fig)
+
+    # Write next to the target and rename, so a reader never sees a half
+    # written image.
+    path = os.path.join(folder, f"{kind}.jpg")
+    tmp_path = os.path.join(folder, f".{kind}.tmp.jpg")
+    fig.savefig(tmp_path, dpi=150)
+    os.replace(tmp_path, path)
+    return path
+
+
+def save_plots(history, folder="plots", colors=None):
+    if history["t"].shape[-1] < 2:
+        return
+
+    os.makedirs(folder, exist_ok=True)
+    for kind in PLOT_KINDS:
+        save_plot(kind, history, folder, colors)
+
+
+class PlotExporter:
+    def __init__(self, folder="plots", workers=len(PLOT_KINDS)):
+        self.folder = folder
+        self.workers = workers
+        self.requests = 0
+        self.coalesced = 0
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._closed = False
+        self._status = ExportStatus("idle", 0, 0, folder, None, 0)
+        self._thread = None
+        self._pool = None
+
+    @property
+    def status(self):
+        with self._cond:
+            return self._status
+
+    def submit(self, history, colors=None):
+        # Only the newest request is kept: clicks that arrive while an export
+        # is running collapse into a single follow-up export. colors is
+        # passed on to save_plot.
+        with self._cond:
+            if self._closed:
+                return
+            self.requests += 1
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = (history, colors)
+            if self._status.state != "running":
+                self._set_status("queued", 0, len(PLOT_KINDS))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="maxwell-plots", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _set_status(self, state, done, total, error=None):
+        self._status = ExportStatus(state, done, total, self.folder, error, self._status.serial + 1)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                (history, colors), self._pending = self._pending, None
+                self._set_status("running", 0, len(PLOT_KINDS))
+
+            try:
+                self._export(history, colors)
+            except Exception as e:
+                print(f"Plot save failed: {e}")
+                with self._cond:
+                    self._set_status("failed", self._status.done, self._status.total, str(e))
+                continue
+
+            with self._cond:
+                if self._pending is None and self._status.state == "running":
+                    self._set_status("done", len(PLOT_KINDS), len(PLOT_KINDS))
+
+    def _export(self, history, colors):
+        # Imported on the first export: nothing here is needed to start the
+        # app.
+        from concurrent.futures.process import BrokenProcessPool
+
+        if history["t"].shape[-1] < 2:
+            with self._cond:
+                self._set_status("empty", 0, 0)
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+        try:
+            self._save_all(history, colors)
+        except BrokenProcessPool:
+            # A worker died; the pool refuses all further work, so it is
+            # replaced and the export tried once more.
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+            self._save_all(history, colors)
+
+    def _save_all(self, history, colors):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        if self._pool is None:
+            # Workers are spawned once and keep matplotlib imported between
+            # exports; "spawn" avoids forking a process that runs other threads.
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+        # Each worker only receives the columns its figure needs.
+        futures = [
+            self._pool.submit(save_plot, kind, {name: history[name] for name in PLOT_COLUMNS[kind]}, self.folder, colors)
+            for kind in PLOT_KINDS
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()
+            with self._cond:
+                self._set_status("running", done, len(PLOT_KINDS))
@@ -0,0 +1,83 @@
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from .config import PROFILE_WINDOW
+
+
+class FrameProfiler:
+    def __init__(self, window=PROFILE_WINDOW):
+        self.window = window
+        self.frames = 0
+        self.phases = {}
+        self.counters = {}
+        self._current = {}
+        self._last = None
+
+    def begin_frame(self):
+        self._current = {}
+        self._last = time.perf_counter()
+
+    def mark(self, phase):
+        # Charges the time since the previous mark to phase; a phase can be
+        # marked several times per frame and its parts add up.
+        now = time.perf_counter()
+        self._current[phase] = self._current.get(phase, 0.0) + (now - self._last)
+        self._last = now
+
+    def add(self, phase, seconds):
+        self._current[phase] = self._current.get(phase, 0.0) + seconds
+
+    def end_frame(self, **counters):
+        for phase, seconds in self._current.items():
+            if phase not in self.phases:
+                self.phases[phase] = deque(maxlen=self.window)
+            self.phases[phase].append(seconds * 1000.0)
+        for name, value in counters.items():
+            if name not in self.counters:
+                self.counters[name] = deque(maxlen=self.window)
+            self.counters[name].append(value)
+        self.frames += 1
+
+    def stats(self):
+        result = {}
+        for phase, samples in self.phases.items():
+            values = np.fromiter(samples, dtype=np.float64, count=len(samples))
+            p50, p99 = np.percentile(values, (50, 99))
+            result[phase] = (float(p50), float(p99))
+        return result
+
+    def latest(self, name, default=0):
+        samples = self.counters.get(name)
+        return samples[-1] if samples else default
+
+    def to_dict(self):
+        phases = {}
+        for phase, samples in self.phases.items():
+            values = np.fromiter(samples, dtype=np.float64, count=len(samples))
+            p50, p99 = np.percentile(values, (50, 99))
+            phases[phase] = {
+                "p50_ms": float(p50),
+                "p99_ms": float(p99),
+                "mean_ms": float(values.mean()),
+                "max_ms": float(values.max()),
+                "samples_ms": values.tolist(),
+            }
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "frames": self.frames,
+            "window": self.window,
+            "phases": phases,
+            "counters": {name: list(samples) for name, samples in self.counters.items()},
+        }
+
+    def dump(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
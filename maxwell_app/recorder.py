@@ -0,0 +1,227 @@
+import argparse
+import csv
+import glob
+import os
+import queue
+import sys
+import threading
+
+import numpy as np
+
+from .config import RECORD_CHUNK_SIZE, SIM_DT
+from .history import FIELDS
+from .integrators import INTEGRATORS
+from .simulation import MaxwellWheelSimulation
+
+
+FORMATS = ("csv", "npz", "parquet")
+
+
+def format_for_path(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in FORMATS:
+        return ext
+    raise ValueError(f"unknown recording format {ext!r}, expected one of {', '.join(FORMATS)}")
+
+
+class CsvChunkWriter:
+    def __init__(self, path):
+        self._file = open(path, "w", newline="")
+        csv.writer(self._file).writerow(FIELDS)
+
+    def write(self, chunk):
+        np.savetxt(self._file, chunk.T, delimiter=",", fmt="%.10g")
+
+    def close(self):
+        self._file.close()
+
+
+class NpzChunkWriter:
+    # An .npz archive cannot be appended to, so the recording is a folder
+    # with one archive per chunk; read_recording() joins them back.
+    def __init__(self, path):
+        self.path = path
+        self._index = 0
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, chunk):
+        name = os.path.join(self.path, f"chunk_{self._index:06d}.npz")
+        np.savez(name, **dict(zip(FIELDS, chunk)))
+        self._index += 1
+
+    def close(self):
+        pass
+
+
+class ParquetChunkWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("запись в Parquet требует пакет pyarrow") from None
+
+        self._pa = pa
+        self._schema = pa.schema([(name, pa.float64()) for name in FIELDS])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, chunk):
+        # Every chunk becomes one row group.
+        table = self._pa.Table.from_arrays([self._pa.array(row) for row in chunk], schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+CHUNK_WRITERS = {"csv": CsvChunkWriter, "npz": NpzChunkWriter, "parquet": ParquetChunkWriter}
+
+
+class Recorder:
+    def __init__(self, path, chunk_size=RECORD_CHUNK_SIZE, fmt=None):
+        self.path = path
+        self.format = fmt or format_for_path(path)
+        if self.format not in CHUNK_WRITERS:
+            raise ValueError(f"unknown recording format {self.format!r}, expected one of {', '.join(FORMATS)}")
+        self.chunk_size = max(1, int(chunk_size))
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._writer = CHUNK_WRITERS[self.format](path)
+
+        self.samples = 0
+        self.chunks_written = 0
+        self.error = None
+
+        self._chunk = np.empty((len(FIELDS), self.chunk_size), dtype=np.float64)
+        self._n = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="maxwell-recorder", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending_chunks(self):
+        return self._queue.qsize()
+
+    def append(self, t, h, v, ep, ek_t, ek_r):
+        n = self._n
+        self._chunk[:, n] = (t, h, v, ep, ek_t, ek_r)
+        self._n = n + 1
+        self.samples += 1
+        if self._n == self.chunk_size:
+            self._hand_off()
+
+    def extend(self, t, h, v, ep, ek_t, ek_r):
+        columns = np.stack((t, h, v, ep, ek_t, ek_r))
+        done = 0
+        while done < columns.shape[1]:
+            count = min(self.chunk_size - self._n, columns.shape[1] - done)
+            self._chunk[:, self._n : self._n + count] = columns[:, done : done + count]
+            self._n += count
+            done += count
+            if self._n == self.chunk_size:
+                self._hand_off()
+        self.samples += done
+
+    def _hand_off(self):
+        # The filled chunk belongs to the writer thread from now on; stepping
+        # continues in a fresh buffer and never waits for the disk.
+        self._queue.put(self._chunk[:, : self._n])
+        self._chunk = np.empty((len(FIELDS), self.chunk_size), dtype=np.float64)
+        self._n = 0
+
+    def close(self):
+        if self._thread is None:
+            return
+        if self._n:
+            self._hand_off()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._writer.close()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self._writer.write(chunk)
+                self.chunks_written += 1
+            except Exception as e:
+                self.error = e
+
+
+def read_recording(path):
+    fmt = "npz" if os.path.isdir(path) else format_for_path(path)
+    if fmt == "csv":
+        data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+        return {name: data[:, i] for i, name in enumerate(FIELDS)}
+    if fmt == "npz":
+        parts = []
+        for name in sorted(glob.glob(os.path.join(path, "chunk_*.npz"))):
+            with np.load(name) as archive:
+                parts.append({field: archive[field] for field in FIELDS})
+        return {field: np.concatenate([part[field] for part in parts]) if parts else np.empty(0) for field in FIELDS}
+
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    return {name: table.column(name).to_numpy() for name in FIELDS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m maxwell_app.recorder",
+        description="Долгий прогон колеса Максвелла без окна с потоковой записью на диск.",
+    )
+    parser.add_argument("-o", "--output", default="run.csv", help="файл записи (.csv, .npz — папка с частями, .parquet)")
+    parser.add_argument("--duration", type=float, default=600.0, help="время моделирования, с")
+    parser.add_argument("--dt", type=float, default=SIM_DT, help="шаг моделирования, с")
+    parser.add_argument("--method", choices=list(INTEGRATORS), default="euler", help="схема интегрирования")
+    parser.add_argument("--m", type=float, help="масса m, кг")
+    parser.add_argument("--R", type=float, help="радиус оси R, мм")
+    parser.add_argument("--J", type=float, help="момент инерции J, кг·м²")
+    parser.add_argument("--h0", type=float, help="ход h₀, м")
+    parser.add_argument("--g", type=float, help="ускорение g, м/с²")
+    parser.add_argument("--tau", type=float, help="момент трения τтр, Н·м (включает трение)")
+    parser.add_argument("--chunk-size", type=int, default=RECORD_CHUNK_SIZE, help="строк в одной части записи")
+    parser.add_argument("--history-cap", type=int, default=0, help="сколько последних шагов держать в памяти в полном разрешении, более старые прореживаются (0 — HISTORY_RECENT_SAMPLES)")
+    args = parser.parse_args(argv)
+
+    sim = MaxwellWheelSimulation()
+    for name in ("m", "J", "h0", "g"):
+        if getattr(args, name) is not None:
+            setattr(sim, name, getattr(args, name))
+    if args.R is not None:
+        sim.R_m = args.R / 1000.0
+    if args.tau is not None:
+        sim.tau = args.tau
+        sim.friction_enabled = True
+    sim.set_integrator(args.method)
+    if args.history_cap > 0:
+        sim.history.max_samples = args.history_cap
+
+    try:
+        sim.recorder = Recorder(args.output, args.chunk_size)
+    except (ValueError, RuntimeError, OSError) as e:
+        parser.error(str(e))
+    sim.running = True
+    try:
+        for _ in range(max(0, int(round(args.duration / args.dt)))):
+            sim.step(args.dt)
+    finally:
+        recorder, sim.recorder = sim.recorder, None
+        recorder.close()
+
+    print(f"{recorder.samples} steps, {recorder.chunks_written} chunks -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import pygame
+
+from .config import BACKGROUND_COLOR, PANEL_BG_COLOR
+
+
+def make_wheel_sprite(radius):
+    size = 2 * radius + 2
+    sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+    center = (size // 2, size // 2)
+    for i in range(radius, 0, -4):
+        f = i / radius
+        c = int(0xC0 * f + 0x80 * (1 - f))
+        pygame.draw.circle(sprite, (c, c, c), center, i)
+    pygame.draw.circle(sprite, (50, 50, 50), center, radius, 2)
+    return sprite
+
+
+def make_background(size, panel_rects, blits=(), lines=()):
+    background = pygame.Surface(size)
+    background.fill(BACKGROUND_COLOR)
+    for rect in panel_rects:
+        pygame.draw.rect(background, PANEL_BG_COLOR, rect)
+    for color, start, end, width in lines:
+        pygame.draw.line(background, color, start, end, width)
+    for surf, pos in blits:
+        background.blit(surf, pos)
+    return background
+
+
+class DirtyRects:
+    def __init__(self):
+        self.rects = []
+        self.full = True
+
+    def invalidate(self):
+        self.full = True
+
+    def add(self, rect):
+        if not self.full:
+            self.rects.append(pygame.Rect(rect))
+
+    def present(self):
+        if self.full:
+            pygame.display.flip()
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.rects = []
+        self.full = False
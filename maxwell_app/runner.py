@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import namedtuple
+
+from .config import SIM_DT, SIM_MAX_STEPS_PER_TICK, SIM_SPEED_MAX, SIM_SPEED_MIN
+
+
+SimSnapshot = namedtuple(
+    "SimSnapshot",
+    ["t", "h", "v", "omega", "theta", "time_to_bottom", "energy_drift", "h0", "running", "history", "comparison"],
+)
+
+
+class SimulationRunner:
+    def __init__(self, sim, dt=SIM_DT, max_steps=SIM_MAX_STEPS_PER_TICK, speed=1.0):
+        self.sim = sim
+        self.dt = dt
+        self.max_steps = max_steps
+        self.speed = speed
+        self.lock = threading.RLock()
+
+        self.steps_total = 0
+        self.steps_last = 0
+        self.dropped_time = 0.0
+        self.busy_time = 0.0
+        # A Comparison, when set, is stepped instead of sim.
+        self.comparison = None
+
+        self._accumulator = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def speed(self):
+        return self._speed
+
+    @speed.setter
+    def speed(self, value):
+        # None means "as fast as possible": every tick runs max_steps steps.
+        if value is not None:
+            value = max(SIM_SPEED_MIN, min(SIM_SPEED_MAX, float(value)))
+        self._speed = value
+
+    @property
+    def active(self):
+        return self.sim if self.comparison is None else self.comparison
+
+    def advance(self, elapsed):
+        with self.lock:
+            if not self.active.running:
+                self._accumulator = 0.0
+                self.steps_last = 0
+                return 0
+
+            if self._speed is None:
+                steps = self.max_steps
+            else:
+                self._accumulator += elapsed * self._speed
+                steps = int(self._accumulator / self.dt)
+                if steps > self.max_steps:
+                    self.dropped_time += (steps - self.max_steps) * self.dt
+                    steps = self.max_steps
+                    self._accumulator = 0.0
+                else:
+                    self._accumulator -= steps * self.dt
+
+            return self.advance_steps(steps)
+
+    def advance_steps(self, steps):
+        with self.lock:
+            start = time.perf_counter()
+            target = self.active
+            for _ in range(steps):
+                target.step(self.dt)
+            self.busy_time += time.perf_counter() - start
+            self.steps_total += steps
+            self.steps_last = steps
+            return steps
+
+    def snapshot(self):
+        with self.lock:
+            sim = self.sim
+            return SimSnapshot(
+                sim.t,
+                sim.h,
+                sim.v,
+                sim.omega,
+                sim.theta,
+                sim.time_to_bottom,
+                sim.energy_drift,
+                sim.h0,
+                sim.running,
+                sim.history.snapshot(),
+                None if self.comparison is None else self.comparison.snapshot(),
+            )
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="maxwell-sim", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            steps = self.advance(now - last)
+            last = now
+            if self._speed is None and steps:
+                time.sleep(0)
+            else:
+                self._stop.wait(min(0.005, self.dt / (self._speed or 1.0)))
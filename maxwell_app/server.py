@@ -0,0 +1,418 @@
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .config import SERVER_BATCH_MAX, SERVER_HOST, SERVER_MAX_BODY, SERVER_PORT, SIM_DT
+from .fit import descent_time
+from .history import FIELDS
+from .integrators import INTEGRATORS
+from .runner import SimulationRunner
+from .simulation import MaxwellWheelSimulation
+from .sweep import PARAM_NAMES, run_sweep
+
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# A handler returns a JSON-able object, or (bytes, headers) for a binary
+# body: little-endian float64, one row per field.
+def binary(rows, fields, **headers):
+    rows = np.ascontiguousarray(rows, dtype="<f8")
+    headers = {"Content-Type": "application/octet-stream", "X-Fields": ",".join(fields), "X-Samples": str(rows.shape[-1]), **headers}
+    return rows.tobytes(), {name: str(value) for name, value in headers.items()}
+
+
+def json_values(array):
+    values = np.asarray(array, dtype=np.float64)
+    if np.isnan(values).any():
+        return [None if math.isnan(x) else x for x in values.tolist()]
+    return values.tolist()
+
+
+def query_value(query, name, convert, default=None):
+    if name not in query:
+        return default
+    try:
+        return convert(query[name][-1])
+    except ValueError:
+        raise ApiError(400, f"{name}: неверное значение {query[name][-1]!r}") from None
+
+
+def query_fields(query, allowed, default):
+    fields = query_value(query, "fields", lambda text: tuple(f for f in text.split(",") if f), default)
+    unknown = [f for f in fields if f not in allowed]
+    if unknown or not fields:
+        raise ApiError(400, f"fields: неизвестные поля {', '.join(unknown)}; допустимы {', '.join(allowed)}")
+    return fields
+
+
+def finite(name, value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name}: ожидалось число, получено {value!r}") from None
+    if not math.isfinite(value):
+        raise ApiError(400, f"{name}: ожидалось конечное число")
+    return value
+
+
+class SimulationServer:
+    # One simulation stepped by its SimulationRunner thread; connections are
+    # served by asyncio and only take the runner lock to read or change it.
+    # Batch questions do not touch it: they go to the vectorised engines.
+    def __init__(self, sim=None, runner=None):
+        self.sim = sim if sim is not None else MaxwellWheelSimulation()
+        self.runner = runner if runner is not None else SimulationRunner(self.sim)
+        self.requests = 0
+        self._writers = set()
+        self._pool = None
+        self.routes = {
+            ("GET", "/state"): self.get_state,
+            ("POST", "/params"): self.set_params,
+            ("POST", "/start"): self.start,
+            ("POST", "/pause"): self.pause,
+            ("POST", "/reset"): self.reset,
+            ("GET", "/history"): self.get_history,
+            ("POST", "/batch"): self.batch,
+        }
+
+    def state(self):
+        with self.runner.lock:
+            sim = self.sim
+            history = sim.history
+            return {
+                "t": sim.t,
+                "h": sim.h,
+                "v": sim.v,
+                "omega": sim.omega,
+                "theta": sim.theta,
+                "time_to_bottom": sim.time_to_bottom,
+                "energy_drift": sim.energy_drift,
+                "running": sim.running,
+                "params": {name: getattr(sim, name) for name in PARAM_NAMES},
+                "friction": sim.friction_enabled,
+                "integrator": sim.integrator.name,
+                "speed": self.runner.speed,
+                "history": {"samples": len(history), "generation": history.generation, "seq": history.seq},
+            }
+
+    async def get_state(self, query, headers, body):
+        return self.state()
+
+    async def set_params(self, query, headers, body):
+        # Physical parameters and the scheme reset the run, as in the window;
+        # the speed does not.
+        changes = self.json_body(headers, body)
+        if not isinstance(changes, dict):
+            raise ApiError(400, "ожидался JSON-объект")
+        unknown = [name for name in changes if name not in PARAM_NAMES + ("friction", "integrator", "speed")]
+        if unknown:
+            raise ApiError(400, f"неизвестные параметры: {', '.join(unknown)}")
+        values = {name: finite(name, changes[name]) for name in PARAM_NAMES if name in changes}
+        integrator = changes.get("integrator")
+        if integrator is not None and integrator not in INTEGRATORS:
+            raise ApiError(400, f"integrator: одна из схем {', '.join(INTEGRATORS)}")
+        friction = changes.get("friction")
+        if "friction" in changes and not isinstance(friction, bool):
+            raise ApiError(400, f"friction: ожидалось true или false, получено {friction!r}")
+        speed = changes.get("speed", self.runner.speed)
+        if speed is not None:
+            speed = finite("speed", speed)
+
+        with self.runner.lock:
+            sim = self.sim
+            for name, value in values.items():
+                setattr(sim, name, value)
+            if "friction" in changes:
+                sim.friction_enabled = friction
+            if integrator is not None:
+                sim.set_integrator(integrator)
+            if values or "friction" in changes or integrator is not None:
+                sim.reset_state(clear_history=True)
+            self.runner.speed = speed
+        return self.state()
+
+    async def start(self, query, headers, body):
+        with self.runner.lock:
+            self.sim.running = True
+        return self.state()
+
+    async def pause(self, query, headers, body):
+        with self.runner.lock:
+            self.sim.running = False
+        return self.state()
+
+    async def reset(self, query, headers, body):
+        with self.runner.lock:
+            self.sim.reset_state(clear_history=True)
+        return self.state()
+
+    async def get_history(self, query, headers, body):
+        # A time window (from/to, seconds) and/or the last N samples of it.
+        # The first `coarse` samples of the whole history are folded buckets,
+        # see History.
+        fields = query_fields(query, FIELDS, FIELDS)
+        t_from = query_value(query, "from", float, -math.inf)
+        t_to = query_value(query, "to", float, math.inf)
+        last = query_value(query, "last", int)
+        snapshot = self.sim.history.snapshot()
+
+        t = snapshot["t"]
+        start = int(np.searchsorted(t, t_from, side="left"))
+        end = int(np.searchsorted(t, t_to, side="right"))
+        if last is not None:
+            start = max(start, end - max(0, last))
+        rows = np.stack([snapshot[name][start:end] for name in fields]) if end > start else np.empty((len(fields), 0))
+        coarse = max(0, min(snapshot.coarse, end) - start)
+
+        if query_value(query, "format", str, "json") == "bin":
+            return binary(rows, fields, **{"X-Coarse": coarse, "X-Generation": snapshot.generation})
+        result = {"generation": snapshot.generation, "samples": rows.shape[-1], "coarse": coarse}
+        result.update((name, row.tolist()) for name, row in zip(fields, rows))
+        return result
+
+    async def batch(self, query, headers, body):
+        # time_to_bottom for N parameter sets: a JSON object of columns (or
+        # scalars) or a float64 body with one row per `fields` entry. Missing
+        # parameters are taken from the current simulation. The closed form
+        # answers at once; "method=simulate" steps BatchMaxwellSimulation for
+        # up to `duration` seconds off the event loop.
+        if headers.get("content-type", "").startswith("application/octet-stream"):
+            fields = query_fields(query, PARAM_NAMES, PARAM_NAMES)
+            if len(body) % (8 * len(fields)):
+                raise ApiError(400, f"тело должно содержать {len(fields)} строк(и) float64")
+            rows = np.frombuffer(body, dtype="<f8").reshape(len(fields), -1)
+            columns = dict(zip(fields, rows))
+            options = {}
+        else:
+            request = self.json_body(headers, body)
+            if not isinstance(request, dict):
+                raise ApiError(400, "ожидался JSON-объект")
+            columns = {name: request[name] for name in PARAM_NAMES if name in request}
+            options = {name: request[name] for name in ("method", "duration", "dt") if name in request}
+        method = options.get("method", query_value(query, "method", str, "analytic"))
+        duration = finite("duration", options.get("duration", query_value(query, "duration", float, 10.0)))
+        dt = finite("dt", options.get("dt", query_value(query, "dt", float, SIM_DT)))
+
+        with self.runner.lock:
+            current = self.sim.params
+        defaults = {name: getattr(current, name) for name in PARAM_NAMES}
+        try:
+            arrays = np.broadcast_arrays(*(np.asarray(columns.get(name, defaults[name]), dtype=np.float64) for name in PARAM_NAMES))
+        except (TypeError, ValueError) as e:
+            raise ApiError(400, f"параметры: {e}") from None
+        grid = {name: np.ravel(array) for name, array in zip(PARAM_NAMES, arrays)}
+        n = len(grid["m"])
+        if n > SERVER_BATCH_MAX:
+            raise ApiError(413, f"не больше {SERVER_BATCH_MAX} наборов за запрос")
+
+        if method == "analytic":
+            ttb = descent_time(grid["m"], grid["R_m"], grid["J"], grid["h0"], grid["g"], grid["tau"])
+        elif method == "simulate":
+            if not 0 < dt <= duration or duration / dt > 1e7:
+                raise ApiError(400, "нужно 0 < dt <= duration и не больше 1e7 шагов")
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(None, partial(run_sweep, grid, duration, dt, pool=self.sweep_pool()))
+            except BrokenProcessPool:
+                # A worker died; the pool is replaced and the sweep run once
+                # more.
+                self.close_pool()
+                results = await loop.run_in_executor(None, partial(run_sweep, grid, duration, dt, pool=self.sweep_pool()))
+            ttb = results["time_to_bottom"]
+        else:
+            raise ApiError(400, "method: analytic или simulate")
+
+        if query_value(query, "format", str, "json") == "bin":
+            return binary(ttb[np.newaxis], ("time_to_bottom",))
+        return {"n": n, "method": method, "time_to_bottom": json_values(ttb)}
+
+    def json_body(self, headers, body):
+        if not body:
+            return {}
+        try:
+            return json.loads(body)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise ApiError(400, f"неверный JSON: {e}") from None
+
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self.routes):
+                raise ApiError(405, f"{method} не поддерживается для {url.path}")
+            raise ApiError(404, f"нет такого адреса: {url.path}")
+        return await handler(parse_qs(url.query), headers, body)
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1 with keep-alive, enough for scripts and curl; one request
+        # at a time per connection, any number of connections.
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ApiError as e:
+                    await respond(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                self.requests += 1
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    result = await self.dispatch(method, target, headers, body)
+                    status = 200
+                except ApiError as e:
+                    result, status = {"error": str(e)}, e.status
+                except Exception as e:
+                    result, status = {"error": f"{type(e).__name__}: {e}"}, 500
+                await respond(writer, status, result, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            self._writers.discard(writer)
+            writer.close()
+            raise
+        self._writers.discard(writer)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def close_connections(self):
+        # Closing the transports ends the handlers' pending reads, so they
+        # return normally instead of being cancelled with the loop.
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for writer in list(self._writers):
+            writer.close()
+        if handlers:
+            await asyncio.wait(handlers, timeout=1.0)
+
+    def sweep_pool(self):
+        # One pool for all batch simulations, started with the first one and
+        # kept until the server closes. "spawn" avoids forking a process that
+        # runs the runner and executor threads.
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def close_pool(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    async def serve(self, host=SERVER_HOST, port=SERVER_PORT, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        self.runner.start()
+        try:
+            if ready is not None:
+                ready(server)
+            await server.serve_forever()
+        finally:
+            server.close()
+            await self.close_connections()
+            await server.wait_closed()
+            self.runner.stop()
+            self.close_pool()
+
+
+async def read_line(reader):
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        # A line longer than the stream limit.
+        raise ApiError(400, "слишком длинная строка запроса или заголовка") from None
+
+
+async def read_request(reader):
+    line = await read_line(reader)
+    if not line.strip():
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise ApiError(400, "неверная строка запроса")
+    method, target, version = parts
+
+    headers = {}
+    while True:
+        line = await read_line(reader)
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise ApiError(400, "неверный Content-Length") from None
+    if length > SERVER_MAX_BODY:
+        raise ApiError(413, f"тело больше {SERVER_MAX_BODY} байт")
+    body = await reader.readexactly(length) if length > 0 else b""
+    return method, target, version, headers, body
+
+
+async def respond(writer, status, result, keep_alive):
+    if isinstance(result, tuple):
+        payload, headers = result
+    else:
+        payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Length: {len(payload)}"]
+    head += [f"{name}: {value}" for name, value in headers.items()]
+    head.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+    await writer.drain()
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT):
+    app = SimulationServer()
+
+    def ready(server):
+        for sock in server.sockets:
+            address = sock.getsockname()
+            print(f"serving on http://{address[0]}:{address[1]}", file=sys.stderr)
+
+    try:
+        asyncio.run(app.serve(host, port, ready))
+    except KeyboardInterrupt:
+        pass
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m maxwell_app.server", description="HTTP/JSON API симуляции колеса Максвелла без окна.")
+    parser.add_argument("--host", default=SERVER_HOST, help=f"адрес (по умолчанию {SERVER_HOST})")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help=f"порт (по умолчанию {SERVER_PORT})")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import json
+import os
+
+import pygame
+
+from .config import SIM_DT
+
+
+SESSION_VERSION = 1
+
+RECORDED_EVENTS = (
+    pygame.QUIT,
+    pygame.KEYDOWN,
+    pygame.KEYUP,
+    pygame.TEXTINPUT,
+    pygame.MOUSEMOTION,
+    pygame.MOUSEBUTTONDOWN,
+    pygame.MOUSEBUTTONUP,
+    pygame.MOUSEWHEEL,
+    pygame.VIDEOEXPOSE,
+    pygame.WINDOWEXPOSED,
+)
+EVENT_TYPES = {pygame.event.event_name(kind): kind for kind in RECORDED_EVENTS}
+
+
+def _plain(value):
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return True
+    if isinstance(value, (tuple, list)):
+        return all(isinstance(x, (bool, int, float)) for x in value)
+    return False
+
+
+def encode_event(event):
+    # Only plain attributes are kept; SDL handles such as the window object
+    # are not needed by the UI and cannot be stored.
+    data = {key: list(value) if isinstance(value, tuple) else value for key, value in event.dict.items() if _plain(value)}
+    data["type"] = pygame.event.event_name(event.type)
+    return data
+
+
+def decode_event(data):
+    data = dict(data)
+    kind = EVENT_TYPES[data.pop("type")]
+    return pygame.event.Event(kind, {key: tuple(value) if isinstance(value, list) else value for key, value in data.items()})
+
+
+class SessionRecorder:
+    def __init__(self, path, dt=SIM_DT):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.frames = 0
+        self._file = open(path, "w", encoding="utf-8")
+        self._write({"version": SESSION_VERSION, "dt": dt})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def frame(self, index, events, steps, t, h):
+        # Frames without input or simulation steps are not written; the
+        # trailer keeps the total so replay renders the same number of frames.
+        recorded = [encode_event(event) for event in events if event.type in RECORDED_EVENTS]
+        if recorded or steps:
+            self._write({"frame": index, "events": recorded, "steps": steps, "t": t, "h": h})
+        self.frames = index + 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._write({"frames": self.frames})
+        self._file.close()
+
+
+class SessionPlayer:
+    def __init__(self, path):
+        self.path = path
+        self._frames = {}
+        self.frames = 0
+        self.mismatches = 0
+        self.first_mismatch = None
+
+        with open(path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or lines[0].get("version") != SESSION_VERSION:
+            raise ValueError(f"{path}: not a session recording of version {SESSION_VERSION}")
+        self.dt = lines[0].get("dt", SIM_DT)
+
+        for record in lines[1:]:
+            if "frame" in record:
+                self._frames[record["frame"]] = record
+                self.frames = max(self.frames, record["frame"] + 1)
+            elif "frames" in record:
+                self.frames = max(self.frames, record["frames"])
+
+    def events(self, index):
+        record = self._frames.get(index)
+        return [decode_event(data) for data in record["events"]] if record else []
+
+    def steps(self, index):
+        record = self._frames.get(index)
+        return record["steps"] if record else 0
+
+    def check(self, index, t, h):
+        record = self._frames.get(index)
+        if record is None or (record["t"] == t and record["h"] == h):
+            return True
+        self.mismatches += 1
+        if self.first_mismatch is None:
+            self.first_mismatch = index
+        return False
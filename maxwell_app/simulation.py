@@ -1,13 +1,49 @@
 import math
 
+import numpy as np
+
+from .analytic import AnalyticMaxwellWheel
+from .config import HISTORY_RECENT_SAMPLES, HISTORY_TIERS
+from .history import History
+from .integrators import get_integrator
+from .params import WheelParams
+from .trajectories import Trajectory
+
+
+def _param(name):
+    # Changing a physical parameter drops the cached WheelParams; it is
+    # rebuilt, with the accelerations step() uses, on the next step, not on
+    # every one.
+    attr = "_" + name
+
+    def get(self):
+        return getattr(self, attr)
+
+    def set(self, value):
+        setattr(self, attr, value)
+        self._params = None
+
+    return property(get, set)
+
 
 class MaxwellWheelSimulation:
+    m = _param("m")
+    R_m = _param("R_m")
+    J = _param("J")
+    h0 = _param("h0")
+    g = _param("g")
+    tau = _param("tau")
+    friction_enabled = _param("friction_enabled")
+
     def __init__(self):
+        self._params = None
         self.m = 0.045
         self.R_m = 0.0075
         self.J = 5.25e-5
         self.h0 = 0.24
         self.g = 9.81
+        self.tau = 0.0005
+        self.friction_enabled = False
 
         self.h = 0.0
         self.v = 0.0
@@ -17,13 +53,55 @@ class MaxwellWheelSimulation:
         self.running = False
 
         self.time_to_bottom = None
+        self.energy_drift = 0.0
+        self.energy_lost = 0.0
+
+        self.integrator = get_integrator("euler")
+        self._a_gravity = 0.0
+        self._a_friction = 0.0
+
+        self.history = History(max_samples=HISTORY_RECENT_SAMPLES, tiers=HISTORY_TIERS)
+        self.recorder = None
+
+    @property
+    def friction_torque(self):
+        return max(0.0, self.tau) if self.friction_enabled else 0.0
+
+    @property
+    def params(self):
+        if self._params is None:
+            p = WheelParams(self.m, self.R_m, self.J, self.h0, self.g, self.friction_torque)
+            self._a_gravity = p.a0
+            self._a_friction = p.a_friction
+            self._params = p
+        return self._params
+
+    def trajectory_key(self, dt):
+        return (self.params, self.integrator.name, dt)
+
+    @property
+    def time_history(self):
+        return self.history.t
+
+    @property
+    def h_history(self):
+        return self.history.h
 
-        self.time_history = []
-        self.h_history = []
-        self.v_history = []
-        self.ep_history = []
-        self.ek_trans_history = []
-        self.ek_rot_history = []
+    @property
+    def v_history(self):
+        return self.history.v
+
+    @property
+    def ep_history(self):
+        return self.history.ep
+
+    @property
+    def ek_trans_history(self):
+        return self.history.ek_t
+
+    @property
+    def ek_rot_history(self):
+        return self.history.ek_r
 
     def reset_state(self, clear_history=True):
         self.h = 0.0
@@ -33,13 +111,83 @@ class MaxwellWheelSimulation:
         self.t = 0.0
         self.running = False
         self.time_to_bottom = None
+        self.energy_drift = 0.0
+        self.energy_lost = 0.0
         if clear_history:
-            self.time_history.clear()
-            self.h_history.clear()
-            self.v_history.clear()
-            self.ep_history.clear()
-            self.ek_trans_history.clear()
-            self.ek_rot_history.clear()
+            self.history.clear()
+
+    def set_integrator(self, name):
+        self.integrator = get_integrator(name)
+
+    def trajectory(self):
+        return Trajectory(
+            self.history.snapshot(),
+            self.t,
+            self.h,
+            self.v,
+            self.omega,
+            self.theta,
+            self.time_to_bottom,
+            self.energy_drift,
+            self.energy_lost,
+        )
+
+    def restore(self, trajectory):
+        # Puts back a stored run, paused where it was left.
+        self.history.load(trajectory.history)
+        self.t = trajectory.t
+        self.h = trajectory.h
+        self.v = trajectory.v
+        self.omega = trajectory.omega
+        self.theta = trajectory.theta
+        self.time_to_bottom = trajectory.time_to_bottom
+        self.energy_drift = trajectory.energy_drift
+        self.energy_lost = trajectory.energy_lost
+        self.running = False
+
+    def _energy_drift(self, ep, ek_t, ek_r, lost):
+        # ep is measured downwards from the start, so the conserved total is
+        # (e0 - ep) + ek_trans + ek_rot plus the work done by friction, as
+        # in step(). lost is that work up to every sample.
+        e0 = self.m * self.g * self.h0
+        if e0 <= 0 or not len(ep):
+            return 0.0
+        return float(np.max(np.abs(ek_t + ek_r - ep + lost))) / e0
+
+    def _acceleration(self, h, v):
+        if v < 0:
+            return self._a_gravity + self._a_friction
+        return self._a_gravity - self._a_friction
+
+    def seek(self, t, dt):
+        engine = AnalyticMaxwellWheel.from_simulation(self)
+        n = max(0, int(round(t / dt)))
+        state = engine.state_at(dt * np.arange(1, n + 1))
+
+        self.history.clear()
+        self.history.extend(state.t, state.h, state.v, state.ep, state.ek_t, state.ek_r)
+        if self.recorder is not None:
+            self.recorder.extend(state.t, state.h, state.v, state.ep, state.ek_t, state.ek_r)
+
+        self.t = n * dt
+        if n:
+            self.h = float(state.h[-1])
+            self.v = float(state.v[-1])
+            self.omega = float(state.omega[-1])
+            self.theta = float(state.theta[-1])
+        else:
+            self.h = 0.0
+            self.v = 0.0
+            self.omega = 0.0
+            self.theta = 0.0
+
+        ttb = engine.time_to_bottom
+        self.time_to_bottom = ttb if ttb is not None and ttb <= self.t else None
+        # The drift is taken from the computed samples, not from the history,
+        # which may already be folded into coarse buckets.
+        lost = engine.energy_lost_at(state.t)
+        self.energy_lost = float(lost[-1]) if n else 0.0
+        self.energy_drift = self._energy_drift(state.ep, state.ek_t, state.ek_r, lost)
 
     def step(self, dt):
         if not self.running:
@@ -49,26 +197,32 @@ class MaxwellWheelSimulation:
         h0 = self.h
         v0 = self.v
 
-        R = max(self.R_m, 1e-6)
-        denom = self.J + self.m * R * R
-        if denom <= 0:
+        p = self._params or self.params
+        if p.denom <= 0:
             return
-        a0 = (self.m * self.g * R * R) / denom
-
-        a = a0
+        R = p.R
+        torque = p.tau
+        a_friction = self._a_friction
+        a = self._a_gravity + a_friction if v0 < 0 else self._a_gravity - a_friction
 
-        if a < 0 and self.v > 0:
+        if (a < 0 and v0 > 0) or (torque > 0 and a <= 0 and v0 >= 0):
             self.v = 0.0
             self.omega = 0.0
             return
 
-        self.v += a * dt
-        self.h += self.v * dt
+        # Friction only changes the acceleration when the direction of
+        # motion changes; a step that keeps it needs no per-stage callbacks.
+        integrator = self.integrator
+        if integrator.single_stage or a_friction == 0.0 or (v0 + a * dt < 0) == (v0 < 0):
+            h, v = integrator.advance_constant(h0, v0, a, dt)
+        else:
+            h, v = integrator.advance(h0, v0, self._acceleration, dt)
 
-        if self.time_to_bottom is None and v0 > 0 and h0 < self.h0 and self.h >= self.h0:
+        h_max = p.h0
+        if self.time_to_bottom is None and v0 > 0 and h0 < h_max and h >= h_max:
             A = 0.5 * a
             B = v0
-            C = h0 - self.h0
+            C = h0 - h_max
             tau = None
             if abs(A) < 1e-12:
                 if abs(B) > 1e-12:
@@ -87,30 +241,145 @@ class MaxwellWheelSimulation:
             if tau is not None:
                 self.time_to_bottom = t0 + tau
 
-        if self.h <= 0.0:
-            self.h = 0.0
-            if self.v < 0:
-                self.v = -self.v
+        if h <= 0.0:
+            h = 0.0
+            if v < 0:
+                v = -v
+
+        if h >= h_max:
+            h = h_max
+            if v > 0:
+                v = -v
 
-        if self.h >= self.h0:
-            self.h = self.h0
-            if self.v > 0:
-                self.v = -self.v
+        # The state is worked on in locals and stored once.
+        omega = v / R
+        lost = self.energy_lost
+        if torque > 0:
+            lost += torque * abs(h - h0) / R
+            self.energy_lost = lost
+        t = t0 + dt
+        self.h = h
+        self.v = v
+        self.omega = omega
+        self.theta += omega * dt
+        self.t = t
 
+        m = p.m
+        ep = m * p.g * h
+        ek_trans = 0.5 * m * v * v
+        ek_rot = 0.5 * p.J * omega * omega
 
-        self.omega = self.v / R
+        e0 = m * p.g * h_max
+        if e0 > 0:
+            drift = abs(ek_trans + ek_rot - ep + lost) / e0
+            if drift > self.energy_drift:
+                self.energy_drift = drift
+
+        self.history.append(t, h, v, ep, ek_trans, ek_rot)
+        if self.recorder is not None:
+            self.recorder.append(t, h, v, ep, ek_trans, ek_rot)
+
+
+class BatchMaxwellSimulation:
+    def __init__(self, m, R_m, J, h0, g=9.81, tau=0.0):
+        params = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (m, R_m, J, h0, g, tau)))
+        self.m, self.R_m, self.J, self.h0, self.g, tau = (np.array(p, dtype=np.float64).ravel() for p in params)
+        self.tau = np.maximum(tau, 0.0)
+        self.n = self.m.shape[0]
+        self.running = False
 
-        
-        self.theta += self.omega * dt
-        self.t += dt
+        # The parameters are fixed for the lifetime of a batch, so the
+        # per-wheel accelerations are computed once.
+        self._R = np.maximum(self.R_m, 1e-6)
+        denom = self.J + self.m * self._R * self._R
+        self._valid = denom > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._a_gravity = np.where(self._valid, (self.m * self.g * self._R * self._R) / denom, 0.0)
+            self._a_friction = np.where(self._valid, self.tau * self._R / denom, 0.0)
+        self.reset_state()
 
+    def __len__(self):
+        return self.n
+
+    def reset_state(self):
+        n = self.n
+        self.h = np.zeros(n)
+        self.v = np.zeros(n)
+        self.omega = np.zeros(n)
+        self.theta = np.zeros(n)
+        self.t = np.zeros(n)
+        self.time_to_bottom = np.full(n, np.nan)
+        self.running = False
+
+    def energies(self):
         ep = self.m * self.g * self.h
         ek_trans = 0.5 * self.m * self.v * self.v
         ek_rot = 0.5 * self.J * self.omega * self.omega
+        return ep, ek_trans, ek_rot
+
+    def step(self, dt):
+        if not self.running:
+            return
+
+        t0 = self.t
+        h0 = self.h
+        v0 = self.v
+
+        R = self._R
+        valid = self._valid
+        a_gravity = self._a_gravity
+        a_friction = self._a_friction
+        a = np.where(v0 < 0, a_gravity + a_friction, a_gravity - a_friction)
+
+        stalled = valid & (((a < 0) & (v0 > 0)) | ((self.tau > 0) & (a <= 0) & (v0 >= 0)))
+        active = valid & ~stalled
+
+        v = np.where(stalled, 0.0, v0)
+        omega = np.where(stalled, 0.0, self.omega)
+
+        v = np.where(active, v + a * dt, v)
+        h = np.where(active, h0 + v * dt, h0)
+
+        crossing = active & np.isnan(self.time_to_bottom) & (v0 > 0) & (h0 < self.h0) & (h >= self.h0)
+        if crossing.any():
+            tau = self._crossing_time(0.5 * a[crossing], v0[crossing], h0[crossing] - self.h0[crossing], dt)
+            found = ~np.isnan(tau)
+            idx = np.flatnonzero(crossing)[found]
+            self.time_to_bottom[idx] = t0[idx] + tau[found]
+
+        floor = active & (h <= 0.0)
+        h = np.where(floor, 0.0, h)
+        v = np.where(floor & (v < 0), -v, v)
+
+        top = active & (h >= self.h0)
+        h = np.where(top, self.h0, h)
+        v = np.where(top & (v > 0), -v, v)
+
+        omega = np.where(active, v / R, omega)
+
+        self.theta = np.where(active, self.theta + omega * dt, self.theta)
+        self.t = np.where(active, t0 + dt, t0)
+        self.h = h
+        self.v = v
+        self.omega = omega
+
+    @staticmethod
+    def _crossing_time(A, B, C, dt):
+        tau = np.full(A.shape, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            linear = np.abs(A) < 1e-12
+            tau_lin = -C / B
+            ok_lin = linear & (np.abs(B) > 1e-12) & (tau_lin >= 0.0) & (tau_lin <= dt)
+            tau[ok_lin] = tau_lin[ok_lin]
 
-        self.time_history.append(self.t)
-        self.h_history.append(self.h)
-        self.v_history.append(self.v)
-        self.ep_history.append(ep)
-        self.ek_trans_history.append(ek_trans)
-        self.ek_rot_history.append(ek_rot)
+            D = B * B - 4.0 * A * C
+            quad = ~linear & (D >= 0.0)
+            s = np.sqrt(np.where(quad, D, 0.0))
+            r1 = (-B - s) / (2.0 * A)
+            r2 = (-B + s) / (2.0 * A)
+            r1 = np.where(quad & (r1 >= 0.0) & (r1 <= dt), r1, np.inf)
+            r2 = np.where(quad & (r2 >= 0.0) & (r2 <= dt), r2, np.inf)
+            r = np.minimum(r1, r2)
+            ok_quad = np.isfinite(r)
+            tau[ok_quad] = r[ok_quad]
+        return tau
@@ -0,0 +1,142 @@
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .config import SIM_DT
+from .simulation import BatchMaxwellSimulation, MaxwellWheelSimulation
+
+
+PARAM_NAMES = ("m", "R_m", "J", "h0", "g", "tau")
+RESULT_NAMES = PARAM_NAMES + ("time_to_bottom", "v_peak", "ep0", "ek_trans", "ek_rot", "rot_fraction")
+
+
+def parse_values(text):
+    text = text.strip()
+    if ":" in text:
+        parts = text.split(":")
+        if len(parts) not in (3, 4):
+            raise argparse.ArgumentTypeError(f"ожидалось start:stop:count[:log], получено {text!r}")
+        start, stop, count = float(parts[0]), float(parts[1]), int(parts[2])
+        if len(parts) == 4:
+            if parts[3] != "log":
+                raise argparse.ArgumentTypeError(f"неизвестная шкала {parts[3]!r}")
+            if start <= 0 or stop <= 0:
+                raise argparse.ArgumentTypeError("логарифмическая шкала требует положительных границ")
+            return np.geomspace(start, stop, count)
+        return np.linspace(start, stop, count)
+    try:
+        return np.array([float(x) for x in text.split(",") if x.strip()], dtype=np.float64)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"не число: {text!r}") from None
+
+
+def build_grid(m, R_m, J, h0, g, tau=(0.0,)):
+    mesh = np.meshgrid(m, R_m, J, h0, g, tau, indexing="ij")
+    return {name: axis.ravel() for name, axis in zip(PARAM_NAMES, mesh)}
+
+
+def run_chunk(params, duration, dt):
+    sim = BatchMaxwellSimulation(params["m"], params["R_m"], params["J"], params["h0"], params["g"], params["tau"])
+    sim.running = True
+
+    v_peak = np.zeros(sim.n)
+    ek_trans = np.zeros(sim.n)
+    ek_rot = np.zeros(sim.n)
+
+    for _ in range(max(0, int(round(duration / dt)))):
+        sim.step(dt)
+        speed = np.abs(sim.v)
+        better = speed > v_peak
+        if better.any():
+            _, ek_t, ek_r = sim.energies()
+            v_peak = np.where(better, speed, v_peak)
+            ek_trans = np.where(better, ek_t, ek_trans)
+            ek_rot = np.where(better, ek_r, ek_rot)
+        if not np.isnan(sim.time_to_bottom).any():
+            break
+
+    total = ek_trans + ek_rot
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rot_fraction = np.where(total > 0, ek_rot / total, np.nan)
+
+    result = dict(params)
+    result["time_to_bottom"] = sim.time_to_bottom
+    result["v_peak"] = v_peak
+    result["ep0"] = sim.m * sim.g * sim.h0
+    result["ek_trans"] = ek_trans
+    result["ek_rot"] = ek_rot
+    result["rot_fraction"] = rot_fraction
+    return result
+
+
+def run_sweep(grid, duration=10.0, dt=SIM_DT, workers=None, chunk_size=4096, pool=None):
+    # pool, when given, is an executor kept by the caller and used instead
+    # of starting one for this sweep.
+    n = len(grid["m"])
+    chunks = [{name: values[i : i + chunk_size] for name, values in grid.items()} for i in range(0, n, chunk_size)]
+
+    if workers == 1 or len(chunks) <= 1:
+        parts = [run_chunk(chunk, duration, dt) for chunk in chunks]
+    elif pool is not None:
+        parts = list(pool.map(run_chunk, chunks, [duration] * len(chunks), [dt] * len(chunks)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(run_chunk, chunks, [duration] * len(chunks), [dt] * len(chunks)))
+
+    if not parts:
+        return {name: np.empty(0) for name in RESULT_NAMES}
+    return {name: np.concatenate([part[name] for part in parts]) for name in RESULT_NAMES}
+
+
+def write_results(results, path):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    if path.endswith(".npz"):
+        np.savez(path, **results)
+        return
+
+    columns = [results[name] for name in RESULT_NAMES]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(RESULT_NAMES)
+        for row in zip(*columns):
+            writer.writerow([f"{x:.10g}" for x in row])
+
+
+def main(argv=None):
+    defaults = MaxwellWheelSimulation()
+    parser = argparse.ArgumentParser(
+        prog="python -m maxwell_app.sweep",
+        description="Перебор параметров колеса Максвелла без окна. "
+        "Значения: одно число, список через запятую или start:stop:count[:log].",
+    )
+    parser.add_argument("--m", type=parse_values, default=np.array([defaults.m]), help="масса m, кг")
+    parser.add_argument("--R", type=parse_values, default=np.array([defaults.R_m * 1000.0]), help="радиус оси R, мм")
+    parser.add_argument("--J", type=parse_values, default=np.array([defaults.J]), help="момент инерции J, кг·м²")
+    parser.add_argument("--h0", type=parse_values, default=np.array([defaults.h0]), help="ход h₀, м")
+    parser.add_argument("--g", type=parse_values, default=np.array([defaults.g]), help="ускорение g, м/с²")
+    parser.add_argument("--tau", type=parse_values, default=np.array([0.0]), help="момент трения τтр, Н·м (0 — без трения)")
+    parser.add_argument("--duration", type=float, default=10.0, help="максимальное время моделирования, с")
+    parser.add_argument("--dt", type=float, default=SIM_DT, help="шаг моделирования, с")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="конфигураций на одну задачу")
+    parser.add_argument("-o", "--output", default="sweep.csv", help="файл результатов (.csv или .npz)")
+    args = parser.parse_args(argv)
+
+    grid = build_grid(args.m, args.R / 1000.0, args.J, args.h0, args.g, args.tau)
+    results = run_sweep(grid, args.duration, args.dt, args.workers, max(1, args.chunk_size))
+    write_results(results, args.output)
+
+    reached = int(np.count_nonzero(~np.isnan(results["time_to_bottom"])))
+    print(f"{len(results['m'])} configurations, {reached} reached bottom -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
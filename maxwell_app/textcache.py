@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+from .config import TEXT_CACHE_SIZE
+
+
+class TextCache:
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def render(self, font, text, color, antialias=True):
+        return self._get((font, text, tuple(color), antialias), font.render, text, antialias, color)
+
+    def size(self, font, text):
+        return self._get((font, text, None, None), font.size, text)
+
+    def _get(self, key, make, *args):
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+        self.misses += 1
+        item = make(*args)
+        self._items[key] = item
+        if len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+        return item
+
+    def clear(self):
+        self._items.clear()
+
+
+text_cache = TextCache()
+
+
+def render_text(font, text, color, antialias=True):
+    return text_cache.render(font, text, color, antialias)
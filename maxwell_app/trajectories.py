@@ -0,0 +1,55 @@
+from collections import OrderedDict, namedtuple
+
+from .config import TRAJECTORY_CACHE_SAMPLES, TRAJECTORY_CACHE_SIZE
+
+
+# history is a HistorySnapshot: it stays valid after the simulation clears
+# its history.
+Trajectory = namedtuple(
+    "Trajectory",
+    ["history", "t", "h", "v", "omega", "theta", "time_to_bottom", "energy_drift", "energy_lost"],
+)
+
+
+class TrajectoryCache:
+    def __init__(self, max_entries=TRAJECTORY_CACHE_SIZE, max_samples=TRAJECTORY_CACHE_SAMPLES):
+        self.max_entries = max_entries
+        self.max_samples = max_samples
+        self._items = OrderedDict()
+        self.samples = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item
+
+    def put(self, key, trajectory):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.samples -= len(old.history)
+        size = len(trajectory.history)
+        if not size or size > self.max_samples:
+            return
+        # The stored copy holds only the used samples, so max_samples bounds
+        # the memory of the cache, not just what it reports.
+        self._items[key] = trajectory._replace(history=trajectory.history.copy())
+        self.samples += size
+        while len(self._items) > self.max_entries or self.samples > self.max_samples:
+            _, dropped = self._items.popitem(last=False)
+            self.samples -= len(dropped.history)
+
+    def clear(self):
+        self._items.clear()
+        self.samples = 0
@@ -1,18 +1,50 @@
 import math
 import pygame
 
-from .config import BUTTON_COLOR, BUTTON_HOVER_COLOR, TEXT_COLOR
+from .config import BUTTON_COLOR, BUTTON_HOVER_COLOR, HIT_CELL_SIZE, PANEL_BG_COLOR, TEXT_COLOR
+from .textcache import render_text
 
 
-class Button:
-    def __init__(self, rect, text, font, callback, icon=None):
+class Widget:
+    # dirty is set whenever the widget looks different from what it last
+    # drew; WidgetTree.draw redraws only such widgets. bounds covers
+    # everything draw() touches and is what hit-testing uses.
+    focusable = False
+
+    def __init__(self, rect):
         self.rect = pygame.Rect(rect)
-        self.text = text
+        self.dirty = True
+
+    @property
+    def bounds(self):
+        return self.rect
+
+    def handle_event(self, event):
+        pass
+
+    def draw(self, surface):
+        pass
+
+
+class Button(Widget):
+    def __init__(self, rect, text, font, callback, icon=None):
+        super().__init__(rect)
+        self._text = text
         self.font = font
         self.callback = callback
         self.icon = icon
         self.hovered = False
 
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        if value != self._text:
+            self._text = value
+            self.dirty = True
+
     def _draw_icon(self, surface, kind, rect, color):
         cx, cy = rect.center
         size = min(rect.width, rect.height)
@@ -88,7 +120,10 @@ class Button:
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEMOTION:
-            self.hovered = self.rect.collidepoint(event.pos)
+            hovered = self.rect.collidepoint(event.pos)
+            if hovered != self.hovered:
+                self.hovered = hovered
+                self.dirty = True
         elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             if self.rect.collidepoint(event.pos) and self.callback:
                 self.callback()
@@ -100,7 +135,7 @@ class Button:
         icon_gap = 10
         icon_size = int(self.rect.height * 0.42)
         icon_size = max(20, min(34, icon_size))
-        text_surf = self.font.render(self.text, True, TEXT_COLOR)
+        text_surf = render_text(self.font, self.text, TEXT_COLOR)
 
         if self.icon:
             icon_rect = pygame.Rect(0, 0, icon_size, icon_size)
@@ -117,12 +152,27 @@ class Button:
         surface.blit(text_surf, text_rect)
 
 
-class Slider:
+class Slider(Widget):
     def __init__(self, rect, value=0.0):
-        self.rect = pygame.Rect(rect)
-        self.value = max(0.0, min(1.0, value))
+        super().__init__(rect)
+        self._value = max(0.0, min(1.0, value))
         self.dragging = False
 
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        if value != self._value:
+            self._value = value
+            self.dirty = True
+
+    @property
+    def bounds(self):
+        # The knob overhangs both ends of the track.
+        return self.rect.inflate(14, 0)
+
     def handle_event(self, event):
         changed = False
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
@@ -151,13 +201,35 @@ class Slider:
         pygame.draw.rect(surface, (180, 180, 180), knob_rect, border_radius=3)
 
 
-class TextInput:
+class TextInput(Widget):
+    focusable = True
+
     def __init__(self, rect, text, font, on_enter=None):
-        self.rect = pygame.Rect(rect)
-        self.text = text
+        super().__init__(rect)
+        self._text = text
         self.font = font
         self.on_enter = on_enter
-        self.active = False
+        self._active = False
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        if value != self._text:
+            self._text = value
+            self.dirty = True
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, value):
+        if value != self._active:
+            self._active = value
+            self.dirty = True
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
@@ -177,26 +249,37 @@ class TextInput:
         border_color = BUTTON_HOVER_COLOR if self.active else (100, 100, 100)
         pygame.draw.rect(surface, (20, 20, 20), self.rect, border_radius=4)
         pygame.draw.rect(surface, border_color, self.rect, 1, border_radius=4)
-        txt_surf = self.font.render(self.text, True, TEXT_COLOR)
+        txt_surf = render_text(self.font, self.text, TEXT_COLOR)
         txt_rect = txt_surf.get_rect(midleft=(self.rect.x + 8, self.rect.centery))
         surface.blit(txt_surf, txt_rect)
 
 
-class Checkbox:
+class Checkbox(Widget):
     def __init__(self, rect, label, font, checked, callback):
-        self.rect = pygame.Rect(rect)
+        super().__init__(rect)
         self.base_rect = pygame.Rect(rect)
         self.label = label
         self.font = font
-        self.checked = checked
+        self._checked = checked
         self.callback = callback
 
+    @property
+    def checked(self):
+        return self._checked
+
+    @checked.setter
+    def checked(self, value):
+        if value != self._checked:
+            self._checked = value
+            self.dirty = True
+
     def set_position(self, x, y, w=None, h=None):
         if w is None:
             w = self.base_rect.width
         if h is None:
             h = self.base_rect.height
         self.rect = pygame.Rect(x, y, w, h)
+        self.dirty = True
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
@@ -213,12 +296,14 @@ class Checkbox:
         if self.checked:
             inner = box_rect.inflate(-6, -6)
             pygame.draw.rect(surface, BUTTON_HOVER_COLOR, inner)
-        label_surf = self.font.render(self.label, True, TEXT_COLOR)
+        label_surf = render_text(self.font, self.label, TEXT_COLOR)
         label_rect = label_surf.get_rect(midleft=(box_rect.right + 10, self.rect.centery))
         surface.blit(label_surf, label_rect)
 
 
-class ParameterControl:
+class ParameterControl(Widget):
+    focusable = True
+
     def __init__(
         self,
         name,
@@ -234,6 +319,7 @@ class ParameterControl:
         on_change,
         has_slider=True,
         log_scale=False,
+        commit_on_release=False,
     ):
         self.name = name
         self.unit = unit
@@ -247,7 +333,9 @@ class ParameterControl:
         self.on_change = on_change
         self.has_slider = has_slider
         self.log_scale = log_scale
+        self.commit_on_release = commit_on_release
         self.value = initial
+        self.pending = None
 
         self.input_width = 140
         self.input_height = 40
@@ -270,8 +358,29 @@ class ParameterControl:
             self.slider = None
 
         self.text_input = TextInput((x, y, self.input_width, self.input_height), self._format_value(initial), font_value, on_enter=self._on_text_enter)
+        self._dirty = True
         self._apply_layout(x, y)
 
+    @property
+    def dirty(self):
+        return self._dirty or self.text_input.dirty or (self.slider is not None and self.slider.dirty)
+
+    @dirty.setter
+    def dirty(self, value):
+        self._dirty = value
+        self.text_input.dirty = value
+        if self.slider is not None:
+            self.slider.dirty = value
+
+    @property
+    def bounds(self):
+        bounds = self.label_rect.union(self.text_input.rect)
+        return bounds.union(self.slider.bounds) if self.slider is not None else bounds
+
+    @property
+    def rect(self):
+        return self.bounds
+
     def get_height(self):
         label_h = self.label_surface.get_height()
         if self.has_slider:
@@ -282,6 +391,7 @@ class ParameterControl:
         self.base_x = x
         self.base_y = y
         self._apply_layout(x, y)
+        self.dirty = True
 
     def _apply_layout(self, x, y):
         label_h = self.label_surface.get_height()
@@ -337,6 +447,16 @@ class ParameterControl:
             changed = self.slider.handle_event(event)
             if changed:
                 v = self._norm_to_value(self.slider.value)
+                if self.commit_on_release:
+                    # While dragging the value is only shown (and can be
+                    # previewed through pending); on_change runs once, on
+                    # release.
+                    self.pending = max(self.min_val, min(self.max_val, v))
+                    self.text_input.text = self._format_value(self.pending)
+                else:
+                    self._apply_value(v)
+            elif self.pending is not None and not self.slider.dragging:
+                v, self.pending = self.pending, None
                 self._apply_value(v)
         self.text_input.handle_event(event)
 
@@ -345,3 +465,161 @@ class ParameterControl:
         if self.slider:
             self.slider.draw(surface)
         self.text_input.draw(surface)
+
+
+class WidgetTree:
+    # Retained widgets: events are routed to the widget under the pointer
+    # through a grid index of bounds, plus the widget holding the mouse
+    # button (drags) and the focused one (keyboard); draw() repaints only
+    # dirty widgets and returns the rects it touched.
+    def __init__(self, widgets=(), cell_size=HIT_CELL_SIZE):
+        self.widgets = []
+        self.cell_size = cell_size
+        self._cells = {}
+        self.hover = None
+        self.pressed = None
+        self.focus = None
+        for widget in widgets:
+            self.add(widget)
+
+    def add(self, widget):
+        self.widgets.append(widget)
+        self._index(widget)
+        return widget
+
+    def reindex(self):
+        self._cells = {}
+        for widget in self.widgets:
+            self._index(widget)
+
+    def _index(self, widget):
+        bounds = widget.bounds
+        size = self.cell_size
+        for cx in range(bounds.left // size, (bounds.right - 1) // size + 1):
+            for cy in range(bounds.top // size, (bounds.bottom - 1) // size + 1):
+                self._cells.setdefault((cx, cy), []).append(widget)
+
+    def hit(self, pos):
+        x, y = pos
+        for widget in self._cells.get((x // self.cell_size, y // self.cell_size), ()):
+            if widget.bounds.collidepoint(pos):
+                return widget
+        return None
+
+    def _local(self, event):
+        return event, True
+
+    def handle_event(self, event):
+        kind = event.type
+        if kind in (pygame.KEYDOWN, pygame.KEYUP, pygame.TEXTINPUT):
+            if self.focus is not None:
+                self.focus.handle_event(event)
+            return
+        if kind not in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+            return
+
+        event, inside = self._local(event)
+        target = self.hit(event.pos) if inside else None
+
+        if kind == pygame.MOUSEMOTION:
+            # The widget the pointer left gets the motion too, so it can
+            # drop its hover state.
+            if target is not self.hover:
+                if self.hover is not None and self.hover is not self.pressed:
+                    self.hover.handle_event(event)
+                self.hover = target
+            if self.pressed is not None:
+                self.pressed.handle_event(event)
+            if target is not None and target is not self.pressed:
+                target.handle_event(event)
+        elif kind == pygame.MOUSEBUTTONDOWN:
+            if self.focus is not None and self.focus is not target:
+                self.focus.handle_event(event)
+            if target is not None:
+                target.handle_event(event)
+            if event.button == 1:
+                self.focus = target if target is not None and target.focusable else None
+                self.pressed = target
+        else:
+            if self.pressed is not None:
+                self.pressed.handle_event(event)
+            elif target is not None:
+                target.handle_event(event)
+            if event.button == 1:
+                self.pressed = None
+
+    def invalidate(self):
+        for widget in self.widgets:
+            widget.dirty = True
+
+    def draw(self, surface, background):
+        # background is in the same coordinates as surface and is what lies
+        # under the widgets.
+        rects = []
+        for widget in self.widgets:
+            if widget.dirty:
+                bounds = widget.bounds
+                surface.blit(background, bounds, bounds)
+                widget.draw(surface)
+                widget.dirty = False
+                rects.append(bounds)
+        return rects
+
+
+class ScrollPanel(WidgetTree):
+    # Widgets are laid out once on a content surface the full height of the
+    # panel; scrolling only changes which part of it is shown.
+    def __init__(self, rect, content_height, widgets=(), color=PANEL_BG_COLOR, cell_size=HIT_CELL_SIZE):
+        super().__init__(widgets, cell_size)
+        self.rect = pygame.Rect(rect)
+        self.color = color
+        self.scroll = 0
+        self.resize(content_height)
+
+    def resize(self, content_height):
+        size = (self.rect.width, max(self.rect.height, content_height))
+        self.background = pygame.Surface(size)
+        self.background.fill(self.color)
+        self.content = self.background.copy()
+        self.content_height = content_height
+        self.scroll = max(self.min_scroll, self.scroll)
+        self._exposed = True
+        super().invalidate()
+
+    @property
+    def min_scroll(self):
+        return min(0, self.rect.height - self.content_height)
+
+    def scroll_by(self, dy):
+        scroll = max(self.min_scroll, min(0, self.scroll + dy))
+        if scroll != self.scroll:
+            self.scroll = scroll
+            self._exposed = True
+
+    def to_content(self, pos):
+        return pos[0] - self.rect.x, pos[1] - self.rect.y - self.scroll
+
+    def _local(self, event):
+        inside = self.rect.collidepoint(event.pos)
+        data = dict(event.dict)
+        data["pos"] = self.to_content(event.pos)
+        return pygame.event.Event(event.type, data), inside
+
+    def invalidate(self):
+        # The cached content is still valid; it only has to be shown again.
+        self._exposed = True
+
+    def draw(self, surface):
+        changed = WidgetTree.draw(self, self.content, self.background)
+        offset = (self.rect.x, self.rect.y + self.scroll)
+        if self._exposed:
+            self._exposed = False
+            surface.blit(self.content, self.rect, pygame.Rect(0, -self.scroll, self.rect.width, self.rect.height))
+            return [self.rect]
+        rects = []
+        for rect in changed:
+            shown = rect.move(offset).clip(self.rect)
+            if shown.width and shown.height:
+                surface.blit(self.content, shown, shown.move(-offset[0], -offset[1]))
+                rects.append(shown)
+        return rects